@@ -0,0 +1,96 @@
+"""
+Compares the per-frame cost of the old and new BGRA -> BGR paths on synthetic grabs.
+
+    old: np.array(shot) copy + cv2.cvtColor allocating a new BGR array
+    new: np.frombuffer view of shot.raw + cv2.cvtColor into a reused array
+
+Usage: python benchmarks/bench_frame_convert.py [--frames 60] [--sizes 1920x1080,3840x2160]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from frame_ops import BgrConverter, bgra_view
+
+
+class FakeShot:
+    """Minimal stand-in for mss.screenshot.ScreenShot (raw BGRA bytearray + array interface)."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.raw = bytearray(np.random.randint(0, 255, width * height * 4, dtype=np.uint8).tobytes())
+
+    @property
+    def __array_interface__(self):
+        return {"version": 3, "shape": (self.height, self.width, 4), "typestr": "|u1", "data": self.raw}
+
+
+def old_path(shot):
+    frame = np.array(shot)
+    return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+def make_new_path():
+    converter = BgrConverter()
+    return lambda shot: converter.convert(bgra_view(shot))
+
+
+def measure(fn, shot, frames):
+    fn(shot) # Warm-up (first call may allocate the reused buffer)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn(shot)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ms_per_frame": elapsed / frames * 1000,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def count_large_allocs(fn, shot, frames, threshold):
+    """Counts allocations of at least threshold bytes made while converting."""
+    fn(shot)
+    count = 0
+    tracemalloc.start()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn(shot)
+        _, peak = tracemalloc.get_traced_memory()
+        # Each frame-sized temporary raises the peak by at least one frame
+        count += int((peak - base) // threshold)
+    tracemalloc.stop()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--sizes", default="1920x1080,2560x1440,3840x2160")
+    args = parser.parse_args()
+
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.split("x"))
+        shot = FakeShot(width, height)
+        bgr_bytes = width * height * 3
+        print(f"{width}x{height} ({args.frames} frames)")
+        for name, fn in (("old", old_path), ("new", make_new_path())):
+            result = measure(fn, shot, args.frames)
+            large = count_large_allocs(fn, shot, args.frames, bgr_bytes)
+            print(f"  {name}: {result['ms_per_frame']:.2f} ms/frame, "
+                  f"frame-sized allocations/frame: {large / args.frames:.1f}, "
+                  f"peak traced: {result['peak_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Drift compensation of AudioMixer on simulated devices: per-block cost and a
+sweep of clock ratios around 1 (devices running slightly slow and fast).
+
+Each ratio runs --minutes of blocks through the mixer. A run fails if the mixer
+raises or if the input it consumed drifts from blocks * ratio (resampling must
+neither lose nor invent frames). Exit code 1 if any ratio fails.
+
+Usage: python benchmarks/bench_mixer.py [--minutes 10] [--ratios 41] [--block-seconds 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from audio_mixer import AudioMixer
+
+
+class FakeStream:
+    """DeviceStream stand-in: delivers any number of frames at a fixed clock ratio."""
+
+    def __init__(self, ratio, channels=2):
+        self.ratio = ratio
+        self.name = f"ratio {ratio:.6f}"
+        self.channels = channels
+        self.start_time = 0.0
+        self.last_time = None
+        self.error = None
+        self.overflows = 0
+        self.discontinuities = 0
+        self.taken = 0
+
+    def rate_ratio(self):
+        return self.ratio
+
+    def take(self, frames):
+        self.taken += frames
+        return np.zeros((frames, self.channels), dtype=np.float32)
+
+
+def run(ratio, samplerate, block, blocks):
+    """Returns (ok, error text, ms per block)."""
+    stream = FakeStream(ratio)
+    mixer = AudioMixer([stream], samplerate, stream.channels, t0=0.0)
+    start = time.perf_counter()
+    try:
+        for _ in range(blocks):
+            mixer.read_mix(block)
+    except Exception as e:
+        return False, f"{type(e).__name__} at block {_}: {e}", 0.0
+    elapsed = time.perf_counter() - start
+    # Taken = consumed (produced * ratio) + what is buffered for the next block's interpolation
+    consumed = stream.taken - len(mixer._tracks[0].pending)
+    expected = blocks * block * ratio
+    if abs(consumed - expected) > 2:
+        return False, f"consumed {consumed} input frames, expected {expected:.0f}", 0.0
+    return True, "", elapsed / blocks * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AudioMixer drift compensation sweep")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Simulated recording length per ratio")
+    parser.add_argument("--ratios", type=int, default=41, help="Ratios swept over [0.995, 1.005]")
+    parser.add_argument("--block-seconds", type=float, default=0.5, help="Mixer block (the recorder uses 0.5)")
+    parser.add_argument("--samplerate", type=int, default=44100)
+    args = parser.parse_args()
+
+    block = int(args.samplerate * args.block_seconds)
+    blocks = int(args.minutes * 60 / args.block_seconds)
+    failures = 0
+    print(f"{'ratio':>10} {'ms/block':>9}  result")
+    for ratio in np.linspace(0.995, 1.005, args.ratios):
+        ok, error, ms = run(float(ratio), args.samplerate, block, blocks)
+        failures += not ok
+        print(f"{ratio:>10.6f} {ms:>9.2f}  {'ok' if ok else error}")
+    print(f"{failures} of {args.ratios} ratios failed over {args.minutes:g} simulated minutes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Headless end-to-end benchmark of ScreenRecorder using synthetic screen and audio sources.
+
+Each configuration runs in its own process so peak RSS is per run. Reports achieved
+capture fps, encode fps, dropped frames, peak RSS and stop/finalize latency.
+
+Usage:
+    python benchmarks/bench_recorder.py --resolutions 1080p,1440p,4k --duration 10
+    python benchmarks/bench_recorder.py --encoder opencv --pattern noise --json
+    python benchmarks/bench_recorder.py --resolutions 4k --output-size 1920x1080
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of finished children (ffmpeg), in MB. None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    scale = 1024 if sys.platform != "darwin" else 1 # ru_maxrss is KB on Linux, bytes on macOS
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return round(own, 1), round(children, 1)
+
+
+def run_child(config):
+    """Runs one recording in this process and returns its result dict."""
+    sys.path.insert(0, SRC)
+    from recorder import ScreenRecorder
+    from synthetic import RESOLUTIONS, SyntheticMicrophone, SyntheticScreen
+
+    width, height = RESOLUTIONS[config["resolution"]]
+    rec = ScreenRecorder()
+    rec.fps = config["fps"]
+    rec.encoder_backend = config["encoder"]
+    rec.queue_depth = config["queue_depth"]
+    rec.drop_policy = config["policy"]
+    rec.multiprocess_encoding = config["multiprocess"]
+    if config["output_size"]:
+        rec.output_size = tuple(int(v) for v in config["output_size"].split("x"))
+    rec.screen_factory = lambda: SyntheticScreen(width, height, pattern=config["pattern"])
+    rec.audio_device = SyntheticMicrophone(signal=config["audio"])
+
+    workdir = tempfile.mkdtemp(prefix="bench_recorder_")
+    rec.temp_dir = workdir # The per-recording workspaces go there too
+    output = os.path.join(workdir, "bench.mp4")
+
+    start = time.perf_counter()
+    rec.start_recording(output)
+    start_latency = time.perf_counter() - start
+    time.sleep(config["duration"])
+    rec.stop_recording()
+
+    stats = rec.get_stats()
+    pacing = stats.get("pacing", {})
+    duration = config["duration"]
+    own_rss, child_rss = peak_rss_mb()
+    result = {
+        **config,
+        "capture_fps": round((stats["captured"] + stats["static_skipped"]) / duration, 2),
+        "encode_fps": stats["encode_fps"],
+        "encoded": stats["encoded"],
+        "ring_dropped": stats["dropped"],
+        "pacing_duplicated": pacing.get("duplicated"),
+        "drift_ms": pacing.get("drift_ms"),
+        "peak_rss_mb": own_rss,
+        "peak_rss_ffmpeg_mb": child_rss,
+        "start_latency_s": round(start_latency, 3),
+        "capture_stop_s": stats["capture_stop_seconds"], # What the UI waits for on STOP
+        "stop_latency_s": stats["stop_seconds"],
+        "output_size": stats["output_size"],
+        "output_mb": round(os.path.getsize(output) / 1e6, 2) if os.path.exists(output) else None,
+    }
+    if not config["keep"]:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless ScreenRecorder benchmark")
+    parser.add_argument("--resolutions", default="1080p,1440p,4k", help="Comma list of 720p,1080p,1440p,4k")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--fps", type=float, default=20.0)
+    parser.add_argument("--encoder", default="auto", choices=["auto", "ffmpeg", "opencv"])
+    parser.add_argument("--pattern", default="moving", choices=["moving", "static", "noise"])
+    parser.add_argument("--audio", default="sine", choices=["sine", "noise", "silence"])
+    parser.add_argument("--queue-depth", type=int, default=8)
+    parser.add_argument("--policy", default="drop-oldest", choices=["drop-oldest", "block"])
+    parser.add_argument("--multiprocess", action="store_true", help="Encode in a separate process")
+    parser.add_argument("--output-size", help="Downscale the output to fit WxH, e.g. 1920x1080")
+    parser.add_argument("--keep", action="store_true", help="Keep output files")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per run")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    results = []
+    for resolution in args.resolutions.split(","):
+        config = {
+            "resolution": resolution, "duration": args.duration, "fps": args.fps,
+            "encoder": args.encoder, "pattern": args.pattern, "audio": args.audio,
+            "queue_depth": args.queue_depth, "policy": args.policy, "keep": args.keep,
+            "multiprocess": args.multiprocess, "output_size": args.output_size,
+        }
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{resolution}: run failed\n{proc.stderr}", file=sys.stderr)
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        if args.json:
+            print(json.dumps(result))
+
+    if not args.json:
+        header = (f"{'res':>6} {'output':>10} {'cap fps':>8} {'enc fps':>8} {'dropped':>8} {'dup':>5} "
+                  f"{'rss MB':>7} {'ffmpeg MB':>9} {'stop s':>7} {'file MB':>8}")
+        print(header)
+        for r in results:
+            print(f"{r['resolution']:>6} {r['output_size']:>10} {r['capture_fps']:>8} {r['encode_fps']:>8} "
+                  f"{r['ring_dropped']:>8} {r['pacing_duplicated']!s:>5} {r['peak_rss_mb']!s:>7} "
+                  f"{r['peak_rss_ffmpeg_mb']!s:>9} {r['stop_latency_s']:>7} {r['output_mb']!s:>8}")
+
+
+if __name__ == "__main__":
+    main()
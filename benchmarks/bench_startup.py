@@ -0,0 +1,113 @@
+"""
+Cold-start profile of the recorder backend.
+
+1. Import-time profile of `import recorder` (python -X importtime), heaviest modules first.
+2. In fresh processes: import time, ScreenRecorder() time, and the START -> first
+   captured frame latency with and without warm_up().
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --real --top 25   # real screen (mss) instead of synthetic
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def import_profile(top):
+    """Returns [(cumulative_ms, self_ms, module)] for the heaviest top-level imports of recorder."""
+    code = f"import sys; sys.path.insert(0, {os.path.abspath(SRC)!r}); import recorder"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue # Header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1: # recorder itself and what it imports directly
+            rows.append((cumulative_us / 1000, self_us / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def run_child(config):
+    """Measures one cold start in this (fresh) process."""
+    started = time.perf_counter()
+    sys.path.insert(0, SRC)
+    from recorder import ScreenRecorder
+    from synthetic import SyntheticMicrophone, SyntheticScreen
+    imported = time.perf_counter()
+
+    rec = ScreenRecorder()
+    if not config["real"]:
+        rec.screen_factory = lambda: SyntheticScreen(1920, 1080)
+        rec.audio_device = SyntheticMicrophone()
+    constructed = time.perf_counter()
+    if config["warm"]:
+        rec.warm_up()
+        rec._capture_worker().wait_ready(10)
+        time.sleep(0.5) # User picks a region meanwhile
+    warmed = time.perf_counter()
+
+    rec.temp_dir = config["workdir"]
+    rec.start_recording(os.path.join(config["workdir"], "startup.mp4"))
+    time.sleep(1.0)
+    rec.stop_recording()
+    first_frame = rec.metrics.stages.get("first_frame")
+    result = {
+        "warm": config["warm"],
+        "import_ms": round((imported - started) * 1000, 1),
+        "construct_ms": round((constructed - imported) * 1000, 1),
+        "warm_up_ms": round((warmed - constructed) * 1000, 1) if config["warm"] else None,
+        "first_frame_ms": round(first_frame.total * 1000, 1) if first_frame else None,
+    }
+    for name in os.listdir(config["workdir"]):
+        os.remove(os.path.join(config["workdir"], name))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorder cold-start profile")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list in the import profile")
+    parser.add_argument("--real", action="store_true", help="Capture the real screen instead of synthetic frames")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    print("Import profile of `import recorder` (ms):")
+    print(f"{'cumulative':>10} {'self':>8}  module")
+    for cumulative, own, name in import_profile(args.top):
+        print(f"{cumulative:>10.1f} {own:>8.1f}  {name}")
+
+    import tempfile
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    print()
+    print(f"{'warm':>5} {'import ms':>10} {'init ms':>8} {'warm-up ms':>11} {'first frame ms':>15}")
+    for warm in (False, True):
+        config = {"warm": warm, "real": args.real, "workdir": workdir}
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"run failed\n{proc.stderr}", file=sys.stderr)
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{r['warm']!s:>5} {r['import_ms']:>10} {r['construct_ms']:>8} {r['warm_up_ms']!s:>11} "
+              f"{r['first_frame_ms']!s:>15}")
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
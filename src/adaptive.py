@@ -0,0 +1,154 @@
+"""
+Adaptive capture rate and encoder preset.
+
+A feedback loop run by the capture thread: once per interval it looks at how
+busy the grab was, how full the frame rings ran (the encoders' backlog) and
+whether frames were dropped or capture ticks missed, and moves the capture fps
+within [min_fps, max_fps]. The output stays constant-rate at the recording fps;
+a lower capture fps only means the pacer repeats frames, which the ffmpeg
+encoder doesn't even receive (its fps filter duplicates them), so fewer frames
+are piped, converted and encoded.
+
+x264 can't switch presets mid-stream, so when the capture fps is already at
+its minimum and the load is still too high, the controller steps the preset
+towards min_preset for the next recording (and back towards max_preset when
+there is headroom at full rate).
+"""
+import logging
+
+from pacing import now
+
+# x264 presets, fastest first
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow", "placebo"]
+
+
+class AdaptiveController:
+    """
+    Decides the capture fps of one recording from the measured load.
+
+    update() is called once per capture tick and returns the fps to capture at.
+    A screen that stayed static for idle_seconds is sampled at min_fps until
+    it changes again (needs the static-frame detector).
+    """
+
+    def __init__(self, max_fps, min_fps=5.0, preset="veryfast", min_preset="ultrafast", max_preset=None,
+                 interval=1.0, idle_seconds=2.0):
+        self.max_fps = float(max_fps)
+        self.min_fps = min(float(min_fps), self.max_fps)
+        self.fps = self.max_fps
+        self.min_preset = min_preset
+        self.max_preset = max_preset or preset
+        if PRESETS.index(self.min_preset) > PRESETS.index(self.max_preset):
+            self.min_preset = self.max_preset
+        self.preset = self._clamp_preset(preset)
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+
+        self.high_load = 0.85 # Busy fraction of the capture thread that counts as overloaded
+        self.low_load = 0.5 # ... and as having headroom
+        self.high_fill = 0.5 # Average ring fill over an interval that counts as an encoder backlog
+        self.low_fill = 0.25 # ... and as encoders keeping up (the frame just queued counts too)
+        self.calm_intervals = 3 # Intervals with headroom before stepping back up
+
+        self.adjustments = []
+        self._started = now()
+        self.lowest_fps = self.fps
+        self._calm = 0
+        self._idle_fps = None # fps to return to when an idle screen changes
+        self._last_change = now()
+        self._last_eval = now()
+        self._last = None
+        self._fill = 0.0 # Sum of the per-tick ring fill since the last evaluation
+        self._ticks = 0
+
+    def update(self, changed, rings, metrics, skipped_ticks):
+        """
+        changed: whether this tick queued a new frame (False = static screen).
+        Returns the capture fps for the next tick.
+        """
+        current = now()
+        if changed:
+            self._last_change = current
+            if self._idle_fps is not None:
+                self._set_fps(self._idle_fps, "screen changed")
+                self._idle_fps = None
+        elif (self.idle_seconds is not None and self._idle_fps is None and self.fps > self.min_fps
+              and current - self._last_change >= self.idle_seconds):
+            self._idle_fps = self.fps
+            self._set_fps(self.min_fps, f"static for {self.idle_seconds:.0f}s")
+
+        # Sampled every tick: a single reading per interval says little about a ring that fills and drains
+        self._fill += max((r.qsize() / r.depth for r in rings), default=0.0)
+        self._ticks += 1
+        if current - self._last_eval >= self.interval:
+            self._evaluate(current, rings, metrics, skipped_ticks)
+        return self.fps
+
+    def _evaluate(self, current, rings, metrics, skipped_ticks):
+        sample = {
+            "capture": sum(metrics.total(s) for s in ("grab", "detect", "queue")),
+            "dropped": sum(r.dropped_frames for r in rings),
+            "skipped": skipped_ticks,
+        }
+        last, self._last = self._last, sample
+        elapsed = current - self._last_eval
+        self._last_eval = current
+        # Encoder pressure is measured by its backlog (how full the rings ran, and drops),
+        # not by write timings: those are taken after blocking writes and say little
+        fill = self._fill / max(self._ticks, 1)
+        self._fill, self._ticks = 0.0, 0
+        if last is None or self._idle_fps is not None:
+            return # Nothing to compare yet / idle: the load says nothing about full-rate capture
+
+        capture_busy = (sample["capture"] - last["capture"]) / elapsed
+        dropped = sample["dropped"] - last["dropped"]
+        skipped = sample["skipped"] - last["skipped"]
+        load = (f"capture {capture_busy:.0%}, queue {fill:.0%}, "
+                f"dropped {dropped}, missed ticks {skipped}")
+
+        if dropped or skipped or fill >= self.high_fill or capture_busy >= self.high_load:
+            self._calm = 0
+            if self.fps > self.min_fps:
+                self._set_fps(max(self.min_fps, self.fps * 0.75), f"load high ({load})")
+            else:
+                self._step_preset(-1, f"load high at minimum fps ({load})")
+        elif fill <= self.low_fill and capture_busy < self.low_load:
+            self._calm += 1
+            if self._calm >= self.calm_intervals:
+                self._calm = 0
+                if self.fps < self.max_fps:
+                    self._set_fps(min(self.max_fps, self.fps * 1.25), f"headroom ({load})")
+                else:
+                    self._step_preset(1, f"headroom at full rate ({load})")
+        else:
+            self._calm = 0
+
+    def _set_fps(self, fps, reason):
+        fps = round(fps, 2)
+        if fps == self.fps:
+            return
+        logging.info(f"Adaptive: capture fps {self.fps:g} -> {fps:g} ({reason})")
+        self.adjustments.append({"t": round(now() - self._started, 2), "fps": fps, "reason": reason})
+        self.fps = fps
+        self.lowest_fps = min(self.lowest_fps, fps)
+
+    def _step_preset(self, step, reason):
+        lo, hi = PRESETS.index(self.min_preset), PRESETS.index(self.max_preset)
+        index = min(hi, max(lo, PRESETS.index(self.preset) + step))
+        if PRESETS[index] == self.preset:
+            return
+        logging.info(f"Adaptive: x264 preset {self.preset} -> {PRESETS[index]} for the next recording ({reason})")
+        self.adjustments.append({"t": round(now() - self._started, 2), "preset": PRESETS[index], "reason": reason})
+        self.preset = PRESETS[index]
+
+    def _clamp_preset(self, preset):
+        lo, hi = PRESETS.index(self.min_preset), PRESETS.index(self.max_preset)
+        return PRESETS[min(hi, max(lo, PRESETS.index(preset)))]
+
+    def report(self):
+        return {
+            "final_fps": self.fps,
+            "lowest_fps": self.lowest_fps,
+            "next_preset": self.preset,
+            "adjustments": self.adjustments,
+        }
@@ -0,0 +1,312 @@
+"""
+Concurrent capture from several audio devices (loopbacks and/or microphones),
+aligned on the shared monotonic clock and drift-compensated with NumPy, then
+mixed into one track or returned as separate tracks. The same concurrent
+capture backs the short device scan of SilenceWatch.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from audio_ring import DiscontinuityWatch, device_buffer
+from audio_writer import SILENCE_LEVEL, dbfs
+from pacing import now
+
+try:
+    import pythoncom
+except ImportError: # Not on Windows
+    pythoncom = None
+
+# Clock drift between devices is a few hundred ppm at most; anything larger is a glitch
+MAX_DRIFT = 0.005
+
+
+class DeviceStream:
+    """Capture thread for one device feeding a FIFO of float32 blocks stamped with arrival time."""
+
+    def __init__(self, mic, samplerate, channels, block_frames, max_buffered_seconds=5.0):
+        self.mic = mic
+        self.name = mic.name
+        self.samplerate = samplerate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.max_buffered = int(max_buffered_seconds * samplerate)
+        self._fifo = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        self.start_time = None # Clock time of the first captured sample
+        self.last_time = None # Clock time of the end of the last block
+        self.frames_in = 0
+        self.buffered = 0
+        self.overflows = 0 # Frames discarded because the mixer fell behind
+        self.error = None
+        self.peak = 0.0 # Levels as captured, before alignment/mixing
+        self.block_peak = 0.0
+        self.silent_frames = 0 # Length of the current run of silent blocks
+        self.discontinuities = 0 # Device buffer overruns reported by soundcard
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"audio-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """Ends capture after the block in flight; wait=False only signals it (stop several devices at once)."""
+        self._running = False
+        if wait and self._thread:
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        try:
+            if pythoncom:
+                pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+            with DiscontinuityWatch() as gaps, \
+                    self.mic.recorder(samplerate=self.samplerate, blocksize=device_buffer(self.samplerate)) as recorder:
+                while self._running:
+                    data = recorder.record(numframes=self.block_frames)
+                    arrived = now()
+                    self.discontinuities = gaps.count
+                    data = _match_channels(np.asarray(data, dtype=np.float32), self.channels)
+                    self.block_peak = float(np.max(np.abs(data))) if data.size else 0.0
+                    self.peak = max(self.peak, self.block_peak)
+                    self.silent_frames = self.silent_frames + len(data) if self.block_peak < SILENCE_LEVEL else 0
+                    with self._lock:
+                        if self.start_time is None:
+                            self.start_time = arrived - len(data) / self.samplerate
+                        self.last_time = arrived
+                        self.frames_in += len(data)
+                        self._fifo.append(data)
+                        self.buffered += len(data)
+                        while self.buffered > self.max_buffered:
+                            dropped = self._fifo.popleft()
+                            self.buffered -= len(dropped)
+                            self.overflows += len(dropped)
+        except Exception as e:
+            self.error = e
+            logging.error(f"Audio device {self.name} failed: {e}")
+
+    def rate_ratio(self):
+        """Measured device rate / nominal rate, from frames delivered over clock time."""
+        with self._lock:
+            if self.start_time is None or self.last_time - self.start_time < 5.0:
+                return 1.0 # Not enough history yet
+            measured = self.frames_in / ((self.last_time - self.start_time) * self.samplerate)
+        return min(max(measured, 1.0 - MAX_DRIFT), 1.0 + MAX_DRIFT)
+
+    def take(self, frames):
+        """Pops up to `frames` frames from the FIFO (may return fewer)."""
+        parts = []
+        got = 0
+        with self._lock:
+            while self._fifo and got < frames:
+                block = self._fifo[0]
+                need = frames - got
+                if len(block) <= need:
+                    parts.append(self._fifo.popleft())
+                    got += len(block)
+                else:
+                    parts.append(block[:need])
+                    self._fifo[0] = block[need:]
+                    got += need
+            self.buffered -= got
+        if not parts:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def _match_channels(block, channels):
+    if block.ndim == 1:
+        block = block[:, None]
+    if block.shape[1] == channels:
+        return block
+    if block.shape[1] == 1:
+        return np.repeat(block, channels, axis=1)
+    return block[:, :channels]
+
+
+class _Track:
+    """Per-device read state: alignment, fractional resampling position and leftover frames."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.aligned = False
+        self.pos = 0.0 # Fractional read position into self.pending
+        self.pending = np.zeros((0, stream.channels), dtype=np.float32)
+        self.underruns = 0
+        self.offset = None # First sample time - t0, seconds
+
+
+class AudioMixer:
+    """
+    Produces fixed-size output blocks on the timeline starting at t0.
+
+    Each device's first sample is placed at its capture time relative to t0
+    (silence before it), and each device is resampled by its measured rate ratio
+    with vectorized linear interpolation, so devices with slightly different
+    clocks stay aligned over long recordings. Nothing recording-sized is buffered.
+    """
+
+    def __init__(self, streams, samplerate, channels, t0, latency=0.15):
+        self.streams = streams
+        self.samplerate = samplerate
+        self.channels = channels
+        self.t0 = t0
+        self.latency = latency # How far behind real time blocks are produced
+        self.produced = 0
+        self._tracks = [_Track(s) for s in streams]
+
+    def wait_for_block(self, frames, running):
+        """Sleeps until every device has had time to deliver the next block. False if stopped."""
+        due = self.t0 + (self.produced + frames) / self.samplerate + self.latency
+        while running():
+            delay = due - now()
+            if delay <= 0:
+                return True
+            time.sleep(min(delay, 0.05))
+        return False
+
+    def wait_for_time(self, t, timeout):
+        """Sleeps until every device has delivered audio up to clock time t. False on timeout."""
+        deadline = now() + timeout
+        while now() < deadline:
+            if all(s.error or (s.last_time is not None and s.last_time >= t) for s in self.streams):
+                return True
+            time.sleep(0.005)
+        return False
+
+    def read_tracks(self, frames):
+        """Returns one (frames, channels) float32 array per device for the next block."""
+        out = [self._read_track(track, frames) for track in self._tracks]
+        self.produced += frames
+        return out
+
+    def read_mix(self, frames):
+        """Returns the next block with all devices summed and clipped."""
+        tracks = self.read_tracks(frames)
+        mix = tracks[0].copy() if len(tracks) == 1 else np.sum(tracks, axis=0)
+        np.clip(mix, -1.0, 1.0, out=mix)
+        return mix
+
+    def _read_track(self, track, frames):
+        stream = track.stream
+        if not track.aligned:
+            if stream.start_time is None:
+                return np.zeros((frames, self.channels), dtype=np.float32) # Not started yet
+            # Silence from t0 (minus what was already produced) until the device's first sample
+            lead = int(round((stream.start_time - self.t0) * self.samplerate)) - self.produced
+            if lead > 0:
+                track.pending = np.zeros((lead, self.channels), dtype=np.float32)
+            elif lead < 0:
+                stream.take(-lead) # Device started before the timeline reached it
+            track.aligned = True
+            track.offset = stream.start_time - self.t0
+            logging.info(f"Audio device {stream.name} aligned, offset {lead / self.samplerate * 1000:.1f} ms")
+
+        ratio = stream.rate_ratio()
+        # Input frames needed: up to the last position pos + (frames - 1) * ratio, plus the one after
+        # it for interpolation (sized from the last position, so ratios below 1 never read past the end)
+        needed = int(np.floor(track.pos + (frames - 1) * ratio)) + 2
+        missing = needed - len(track.pending)
+        if missing > 0:
+            fresh = stream.take(missing)
+            if len(fresh) < missing:
+                track.underruns += 1
+                fresh = np.concatenate([fresh, np.zeros((missing - len(fresh), self.channels), dtype=np.float32)])
+            track.pending = np.concatenate([track.pending, fresh]) if len(track.pending) else fresh
+
+        positions = track.pos + np.arange(frames) * ratio
+        index = positions.astype(np.int64)
+        frac = (positions - index)[:, None].astype(np.float32)
+        data = track.pending
+        block = data[index] * (1.0 - frac) + data[index + 1] * frac
+
+        consumed = int(np.floor(track.pos + frames * ratio))
+        track.pos = track.pos + frames * ratio - consumed
+        track.pending = data[consumed:]
+        return block
+
+    def stats(self):
+        return {
+            t.stream.name: {
+                "rate_ratio": round(t.stream.rate_ratio(), 6),
+                "underruns": t.underruns,
+                "offset_ms": round(t.offset * 1000, 1) if t.offset is not None else None,
+                "overflow_frames": t.stream.overflows,
+                "discontinuities": t.stream.discontinuities,
+                "error": str(t.stream.error) if t.stream.error else None,
+            }
+            for t in self._tracks
+        }
+
+
+def scan_devices(devices, samplerate, seconds=1.0):
+    """
+    Captures all devices at once for `seconds` (one DeviceStream each, as in a
+    multi-device recording) and returns {name: peak level}.
+    """
+    streams = [DeviceStream(d, samplerate, 2, int(samplerate * 0.1), max_buffered_seconds=seconds)
+               for d in devices]
+    for stream in streams:
+        stream.start()
+    time.sleep(seconds)
+    for stream in streams:
+        stream.stop(wait=False)
+    for stream in streams:
+        stream.stop()
+    return {stream.name: stream.peak for stream in streams if stream.error is None}
+
+
+class SilenceWatch:
+    """
+    Warns when the recorded device has been silent for warn_seconds while one of
+    the candidate devices (e.g. the other loopbacks) is playing sound, which
+    usually means the wrong output device was picked. The candidates are
+    sampled by a short background scan, once per run of silence.
+    """
+
+    def __init__(self, device_name, candidates, samplerate, warn_seconds=3.0, on_warning=None):
+        self.device_name = device_name
+        self.candidates = list(candidates)
+        self.samplerate = samplerate
+        self.warn_seconds = warn_seconds
+        self.on_warning = on_warning
+        self.warning = None
+        self.scans = 0
+        self._armed = True
+        self._thread = None
+
+    def check(self, silent_frames):
+        """Called by the audio thread after each block with the device's current silent run."""
+        if silent_frames < self.warn_seconds * self.samplerate:
+            self._armed = True # Sound again; a new silent run gets a new scan
+            return
+        if not self._armed or not self.candidates or (self._thread and self._thread.is_alive()):
+            return
+        self._armed = False
+        self._thread = threading.Thread(target=self._scan, name="audio-scan", daemon=True)
+        self._thread.start()
+
+    def _scan(self):
+        try:
+            if pythoncom:
+                pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+            self.scans += 1
+            peaks = scan_devices(self.candidates, self.samplerate)
+        except Exception as e:
+            logging.error(f"Audio device scan failed: {e}")
+            return
+        playing = {name: peak for name, peak in peaks.items() if peak >= SILENCE_LEVEL}
+        if not playing:
+            logging.info(f"{self.device_name} is silent; no other device has sound either.")
+            return
+        name = max(playing, key=playing.get)
+        self.warning = (f"{self.device_name} is silent but sound is playing on {name} "
+                        f"({dbfs(playing[name]):.0f} dBFS)")
+        logging.warning(self.warning)
+        if self.on_warning:
+            self.on_warning(self.warning)
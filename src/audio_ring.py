@@ -0,0 +1,145 @@
+"""
+Audio capture plumbing: a preallocated single-producer/single-consumer ring of
+float32 frames, and counting of soundcard's discontinuity warnings on the
+threads that read from a device.
+
+The capture thread only reads small device blocks and copies them into the
+ring, so it is back in record() almost at once and a stop is seen within one
+small block; a writer thread drains the ring and does the conversion and the
+(possibly blocking) sink writes.
+"""
+import sys
+import threading
+import warnings
+
+import numpy as np
+
+_watch_lock = threading.Lock()
+_watchers = {} # Thread ident -> DiscontinuityWatch of that thread
+_watch_scope = None # catch_warnings() held while any thread watches
+
+
+def device_buffer(samplerate, seconds=0.2):
+    """
+    blocksize for mic.recorder(). On Windows it is the WASAPI buffer (default: one
+    ~10 ms device period), which a short stall of the capture thread overruns.
+    Elsewhere (PulseAudio) it sets the read granularity, which would only add latency.
+    """
+    return int(samplerate * seconds) if sys.platform == "win32" else None
+
+
+class DiscontinuityWatch:
+    """
+    Context manager for a device reader thread: counts soundcard's "data discontinuity
+    in recording" warnings (device buffer overruns) raised on that thread in .count,
+    instead of printing them.
+
+    warnings state is process-wide and catch_warnings() is not thread-safe, so one
+    catch_warnings() scope is shared: the first thread to watch enters it (with an
+    "always" filter for these warnings, which would otherwise show once per code
+    location, and a hook), the last one to leave restores everything. Warnings from
+    threads that don't watch go on to the previous hook unchanged.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._ident = None
+
+    def __enter__(self):
+        global _watch_scope
+        with _watch_lock:
+            if not _watchers:
+                scope = warnings.catch_warnings()
+                scope.__enter__()
+                try:
+                    warnings.filterwarnings("always", message=".*discontinuity")
+                    warnings.showwarning = _counting_hook(warnings.showwarning)
+                except BaseException:
+                    scope.__exit__(None, None, None)
+                    raise
+                _watch_scope = scope
+            self._ident = threading.get_ident()
+            _watchers[self._ident] = self
+        return self
+
+    def __exit__(self, *exc):
+        global _watch_scope
+        with _watch_lock:
+            _watchers.pop(self._ident, None)
+            if not _watchers and _watch_scope is not None:
+                _watch_scope.__exit__(None, None, None)
+                _watch_scope = None
+
+
+def _counting_hook(previous):
+    def showwarning(message, category, filename, lineno, file=None, line=None):
+        watch = _watchers.get(threading.get_ident()) if "discontinuity" in str(message) else None
+        if watch is not None:
+            watch.count += 1
+        else:
+            previous(message, category, filename, lineno, file, line)
+    return showwarning
+
+
+class AudioRing:
+    """
+    Lock-free ring for one producer and one consumer thread.
+
+    The producer only advances `written`, the consumer only advances `read`;
+    each publishes its counter with a single attribute store after touching the
+    buffer, so neither needs a lock. A block that doesn't fit is dropped and
+    counted (the writer fell behind by the whole capacity), never overwriting
+    frames not read yet.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._buffer = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.written = 0 # Total frames put (producer)
+        self.read = 0 # Total frames taken (consumer)
+        self.mark = (0, None) # (written, arrival time) of the last block put
+        self.dropped_frames = 0
+        self.overruns = 0 # Blocks dropped because the ring was full
+        self.closed = False
+
+    @property
+    def available(self):
+        return self.written - self.read
+
+    def put(self, block, arrived):
+        """Copies block (frames x channels) in; arrived is the clock time its last frame was captured. False if dropped."""
+        frames = len(block)
+        if frames > self.capacity - (self.written - self.read):
+            self.dropped_frames += frames
+            self.overruns += 1
+            return False
+        start = self.written % self.capacity
+        first = min(frames, self.capacity - start)
+        self._buffer[start:start + first] = block[:first]
+        self._buffer[:frames - first] = block[first:]
+        self.written += frames
+        self.mark = (self.written, arrived)
+        return True
+
+    def take(self):
+        """
+        Returns (frames, arrival time of the last of them) for everything put so far,
+        as a copy the producer can't overwrite; (None, None) if empty.
+        """
+        end, arrived = self.mark
+        frames = end - self.read
+        if frames <= 0:
+            return None, None
+        start = self.read % self.capacity
+        first = min(frames, self.capacity - start)
+        if first == frames:
+            data = self._buffer[start:start + frames].copy()
+        else:
+            data = np.concatenate([self._buffer[start:], self._buffer[:frames - first]])
+        self.read = end
+        return data, arrived
+
+    def close(self):
+        """Producer is done; the consumer drains what is left and stops."""
+        self.closed = True
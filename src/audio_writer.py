@@ -0,0 +1,164 @@
+import math
+import wave
+
+import numpy as np
+
+# Blocks peaking below -60 dBFS count as silence
+SILENCE_LEVEL = 0.001
+
+
+def dbfs(level):
+    """Linear level (0..1) in dBFS, floored at -120."""
+    return 20 * math.log10(level) if level > 1e-6 else -120.0
+
+
+class PcmConverter:
+    """
+    Converts soundcard float32 blocks (-1.0..1.0) to interleaved int16 PCM,
+    reusing its scratch buffers between blocks instead of allocating per block.
+    Also keeps running peak/mean/RMS levels, the levels of the last block and
+    where sound starts and ends, so silence can be reported (and trimmed)
+    without holding the whole recording.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self._scratch = None
+        self._pcm = None
+        self.frames = 0
+        self.peak = 0.0
+        self._abs_sum = 0.0
+        self._square_sum = 0.0
+        self.block_peak = 0.0 # Levels of the last block, for live meters
+        self.block_rms = 0.0
+        self.first_sound = None # Frame offsets of the first / past the last non-silent block
+        self.last_sound = None
+        self.silent_frames = 0 # Length of the current run of silent blocks
+
+    def convert(self, block):
+        """Returns an int16 view of block valid until the next call."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 1:
+            block = block[:, None]
+        if block.shape[1] != self.channels:
+            # Device layout differs from the stream: upmix mono, or keep the first channels
+            if block.shape[1] == 1:
+                block = np.repeat(block, self.channels, axis=1)
+            else:
+                block = block[:, :self.channels]
+        if self._scratch is None or self._scratch.shape != block.shape:
+            self._scratch = np.empty(block.shape, dtype=np.float32)
+            self._pcm = np.empty(block.shape, dtype=np.int16)
+
+        # Levels
+        np.abs(block, out=self._scratch)
+        if block.size:
+            self.block_peak = float(self._scratch.max())
+            self.peak = max(self.peak, self.block_peak)
+            self._abs_sum += float(self._scratch.sum())
+            np.multiply(self._scratch, self._scratch, out=self._scratch)
+            squares = float(self._scratch.sum())
+            self._square_sum += squares
+            self.block_rms = math.sqrt(squares / block.size)
+            if self.block_peak >= SILENCE_LEVEL:
+                if self.first_sound is None:
+                    self.first_sound = self.frames
+                self.last_sound = self.frames + len(block)
+                self.silent_frames = 0
+            else:
+                self.silent_frames += len(block)
+        self.frames += len(block)
+
+        # Scale and clip in place, then cast into the reused int16 buffer
+        np.multiply(block, 32767, out=self._scratch)
+        np.clip(self._scratch, -32768, 32767, out=self._scratch)
+        self._pcm[...] = self._scratch
+        return self._pcm
+
+    @property
+    def mean(self):
+        samples = self.frames * self.channels
+        return self._abs_sum / samples if samples else 0.0
+
+    @property
+    def rms(self):
+        samples = self.frames * self.channels
+        return math.sqrt(self._square_sum / samples) if samples else 0.0
+
+
+class WavStreamWriter:
+    """
+    Appends audio blocks to a 16-bit WAV file as they arrive.
+    The RIFF header is patched once on close, so memory stays constant
+    regardless of the recording length.
+    """
+
+    def __init__(self, path, samplerate, channels):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.converter = PcmConverter(channels)
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(samplerate)
+
+    def write(self, block):
+        """Writes a float32 block of shape (frames, channels)."""
+        pcm = self.converter.convert(block)
+        # writeframesraw skips the per-call header patch done by writeframes
+        self._wav.writeframesraw(pcm)
+
+    def write_silence(self, frames):
+        self.write(np.zeros((frames, self.channels), dtype=np.float32))
+
+    @property
+    def frames(self):
+        return self.converter.frames
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close() # Patches RIFF/data sizes
+            self._wav = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AudioTee:
+    """
+    Writes every block to several sinks, so one audio capture feeds several
+    outputs (multi-region recordings). Levels are those of the first sink.
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write(self, block):
+        for sink in self.sinks:
+            sink.write(block)
+
+    def write_silence(self, frames):
+        for sink in self.sinks:
+            sink.write_silence(frames)
+
+    @property
+    def frames(self):
+        return self.sinks[0].frames
+
+    @property
+    def converter(self):
+        return self.sinks[0].converter
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
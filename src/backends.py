@@ -0,0 +1,356 @@
+"""
+Capture backends: where frames and audio come from.
+
+A frame backend opens an mss-like screen context (.monitors, .grab(monitor) ->
+BGRA shot with .raw/.width/.height, .close()); calling the backend opens one, so
+it can be used as ScreenRecorder.screen_factory. An audio backend lists
+soundcard-like devices as a DeviceSnapshot.
+
+mss and soundcard are the defaults. Pillow's ImageGrab is a second desktop
+source; synthetic and file sources run without a desktop or an audio device.
+probe_frame_backends() times grabs of the recorded region on each desktop
+backend so the recorder can keep the fastest one.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import wave
+
+import numpy as np
+
+from devices import DeviceSnapshot, soundcard, soundcard_snapshot
+from frame_ops import bgra_view
+from pacing import now
+from synthetic import RESOLUTIONS, RawShot, RealtimeRecorder, SyntheticMicrophone, SyntheticScreen
+
+
+class FrameBackend:
+    """Base class. desktop: captures the real screen ("auto" only probes these)."""
+    name = None
+    desktop = True
+
+    def available(self):
+        return True
+
+    def open(self):
+        raise NotImplementedError
+
+    def __call__(self):
+        return self.open()
+
+    def __repr__(self):
+        return f"<{self.name} capture>"
+
+
+class MssBackend(FrameBackend):
+    name = "mss"
+
+    def available(self):
+        return importlib.util.find_spec("mss") is not None
+
+    def open(self):
+        import mss # Imported on first use, off the startup path
+        return mss.mss()
+
+
+class PilBackend(FrameBackend):
+    name = "pil"
+
+    def available(self):
+        if importlib.util.find_spec("PIL") is None:
+            return False
+        return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+    def open(self):
+        return PilScreen()
+
+
+class SyntheticBackend(FrameBackend):
+    name = "synthetic"
+    desktop = False
+
+    def __init__(self, width=1920, height=1080, pattern="moving"):
+        self.width = width
+        self.height = height
+        self.pattern = pattern
+
+    def open(self):
+        return SyntheticScreen(self.width, self.height, pattern=self.pattern)
+
+
+class FileBackend(FrameBackend):
+    name = "file"
+    desktop = False
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def open(self):
+        return FileScreen(self.path, self.loop)
+
+
+class PilScreen:
+    """
+    mss-like context over PIL.ImageGrab. Pillow grabs the whole screen and crops
+    it to the bbox, so it is mostly a fallback where mss fails (the probe decides).
+    Only the primary monitor is listed; regions may lie on any monitor on Windows.
+    """
+
+    def __init__(self):
+        from PIL import ImageGrab
+        self._grab = ImageGrab.grab
+        self._all_screens = sys.platform == "win32"
+        width, height = self._grab().size
+        self.monitors = [{"left": 0, "top": 0, "width": width, "height": height} for _ in range(2)]
+
+    def grab(self, monitor):
+        left, top = int(monitor["left"]), int(monitor["top"])
+        width, height = int(monitor["width"]), int(monitor["height"])
+        image = self._grab(bbox=(left, top, left + width, top + height), all_screens=self._all_screens)
+        if image.size != (width, height): # HiDPI grabs on macOS
+            image = image.resize((width, height))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return RawShot(bytearray(image.tobytes("raw", "BGRX")), width, height)
+
+    def close(self):
+        pass
+
+
+class FileScreen:
+    """
+    mss-like context replaying a video file as the screen, in real time from the
+    first grab: each grab returns the frame due at that moment (repeated frames
+    when grabbing faster than the file's fps, skipped ones when slower). Loops at
+    the end, or holds the last frame.
+    """
+
+    def __init__(self, path, loop=True):
+        import cv2
+        self._cv2 = cv2
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise IOError(f"Cannot open video file: {path}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.monitors = [{"left": 0, "top": 0, "width": self.width, "height": self.height} for _ in range(2)]
+        self.loop = loop
+        self._position = -1 # Index of the decoded frame in _frame
+        self._frame = None
+        self._started = None
+
+    def _advance(self, target):
+        """Decodes frame number target (skipping frames before it without converting them)."""
+        while self._position < target - 1:
+            if not self._cap.grab():
+                return False
+            self._position += 1
+        ok, frame = self._cap.read()
+        if not ok:
+            return False
+        self._position += 1
+        self._frame = self._cv2.cvtColor(frame, self._cv2.COLOR_BGR2BGRA)
+        return True
+
+    def grab(self, monitor):
+        if self._started is None:
+            self._started = now()
+        target = int((now() - self._started) * self.fps)
+        if target > self._position and not self._advance(target):
+            if self.loop and self._position > 0:
+                self._cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+                self._position = -1
+                self._started = now()
+                self._advance(0)
+            if self._frame is None:
+                raise IOError("Video file has no frames")
+
+        left, top = int(monitor["left"]), int(monitor["top"])
+        width, height = int(monitor["width"]), int(monitor["height"])
+        region = self._frame[max(top, 0):top + height, max(left, 0):left + width]
+        if region.shape[:2] != (height, width): # Region reaches past the video: pad with black
+            padded = np.zeros((height, width, 4), dtype=np.uint8)
+            padded[:region.shape[0], :region.shape[1]] = region
+            region = padded
+        return RawShot(bytearray(region.tobytes()), width, height)
+
+    def close(self):
+        self._cap.release()
+
+
+def desktop_backends():
+    """The desktop frame backends installed here, in preference order."""
+    return [b for b in (MssBackend(), PilBackend()) if b.available()]
+
+
+def frame_backend(spec):
+    """A FrameBackend from a name: mss, pil, synthetic[:720p|1080p|1440p|4k], file:PATH."""
+    if isinstance(spec, FrameBackend):
+        return spec
+    name, _, arg = spec.partition(":")
+    if name == "mss":
+        return MssBackend()
+    if name == "pil":
+        return PilBackend()
+    if name == "synthetic":
+        return SyntheticBackend(*RESOLUTIONS[arg or "1080p"])
+    if name == "file" and arg:
+        return FileBackend(arg)
+    raise ValueError(f"Unknown capture backend: {spec}")
+
+
+def probe_frame_backends(backends, region, seconds=0.25, min_grabs=3):
+    """
+    Times grabs (plus the array view the recorder takes of each) of one region on every backend.
+    region(monitors) returns the mss monitor dict to grab from a context's monitor list.
+    Returns (fastest backend or None, [{"backend", "grab_fps", "open_ms"}] fastest first).
+    """
+    results = []
+    for backend in backends:
+        try:
+            started = now()
+            sct = backend.open()
+            try:
+                open_seconds = now() - started
+                rect = region(sct.monitors)
+                sct.grab(rect) # The first grab allocates buffers; not timed
+                grabs = 0
+                started = now()
+                while grabs < min_grabs or now() - started < seconds:
+                    bgra_view(sct.grab(rect))
+                    grabs += 1
+                fps = grabs / (now() - started)
+            finally:
+                sct.close()
+        except Exception as e:
+            logging.warning(f"Capture backend {backend.name} failed the probe: {e}")
+            continue
+        results.append((fps, open_seconds, backend))
+    results.sort(key=lambda r: -r[0])
+    report = [{"backend": b.name, "grab_fps": round(fps, 1), "open_ms": round(o * 1000, 1)} for fps, o, b in results]
+    return (results[0][2] if results else None), report
+
+
+class AudioBackend:
+    """Base class: snapshot() lists the devices as a DeviceSnapshot."""
+    name = None
+
+    def available(self):
+        return True
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{self.name} audio>"
+
+
+class SoundcardAudio(AudioBackend):
+    name = "soundcard"
+
+    def available(self):
+        return soundcard() is not None
+
+    def snapshot(self):
+        return soundcard_snapshot()
+
+
+class SyntheticAudio(AudioBackend):
+    """A sine (or noise/silence) loopback and a quiet noise microphone."""
+    name = "synthetic"
+
+    def __init__(self, signal="sine"):
+        self.loopback = SyntheticMicrophone(signal=signal)
+        self.microphone = SyntheticMicrophone(signal="noise", amplitude=0.05, name="Synthetic microphone",
+                                              loopback=False)
+
+    def snapshot(self):
+        # The loopback doubles as the default speaker, so the recorder picks it
+        return DeviceSnapshot(self.loopback, self.microphone, [self.loopback, self.microphone])
+
+
+class WavAudio(AudioBackend):
+    """One loopback device playing a WAV file."""
+    name = "wav"
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self._device = None
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def snapshot(self):
+        if self._device is None:
+            self._device = WavMicrophone(self.path, self.loop)
+        return DeviceSnapshot(self._device, None, [self._device])
+
+
+class WavMicrophone:
+    """soundcard-like loopback device replaying a PCM WAV file in real time (resampled to the requested rate)."""
+
+    def __init__(self, path, loop=True):
+        with wave.open(path, "rb") as f:
+            width = f.getsampwidth()
+            self.channels = f.getnchannels()
+            self.samplerate = f.getframerate()
+            raw = f.readframes(f.getnframes())
+        if width == 1:
+            samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width in (2, 4):
+            dtype = np.int16 if width == 2 else np.int32
+            samples = np.frombuffer(raw, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+        else:
+            raise ValueError(f"{path}: {width * 8}-bit WAV files are not supported")
+        self.samples = samples.reshape(-1, self.channels)
+        self.name = os.path.basename(path)
+        self.id = os.path.abspath(path)
+        self.isloopback = True
+        self.loop = loop
+        self._resampled = {self.samplerate: self.samples}
+
+    def _at_rate(self, samplerate):
+        if samplerate not in self._resampled:
+            count = int(round(len(self.samples) * samplerate / self.samplerate))
+            source = np.arange(len(self.samples)) / self.samplerate
+            target = np.arange(count) / samplerate
+            self._resampled[samplerate] = np.stack(
+                [np.interp(target, source, self.samples[:, c]) for c in range(self.channels)], axis=1
+            ).astype(np.float32)
+        return self._resampled[samplerate]
+
+    def generate(self, position, numframes, samplerate):
+        samples = self._at_rate(samplerate)
+        if not len(samples):
+            return np.zeros((numframes, self.channels), dtype=np.float32)
+        index = np.arange(position, position + numframes)
+        if self.loop:
+            return samples[index % len(samples)]
+        block = np.zeros((numframes, self.channels), dtype=np.float32)
+        valid = index < len(samples)
+        block[valid] = samples[index[valid]]
+        return block
+
+    def recorder(self, samplerate, channels=None, blocksize=None):
+        return RealtimeRecorder(self, samplerate)
+
+
+def audio_backend(spec):
+    """An AudioBackend from a name: soundcard, synthetic[:sine|noise|silence], wav:PATH."""
+    if isinstance(spec, AudioBackend):
+        return spec
+    name, _, arg = spec.partition(":")
+    if name == "soundcard":
+        return SoundcardAudio()
+    if name == "synthetic":
+        return SyntheticAudio(arg or "sine")
+    if name == "wav" and arg:
+        return WavAudio(arg)
+    raise ValueError(f"Unknown audio backend: {spec}")
@@ -0,0 +1,90 @@
+"""
+Pre-warmed screen capture: one long-lived thread owns the mss instance.
+
+Creating mss.mss() and doing the first grab (GDI device contexts and the
+capture bitmap) is the slowest part of the first frame. mss handles belong
+to the thread that created them, so instead of a fresh context per recording
+the capture loop itself runs on this thread, which is warmed up at startup.
+"""
+import logging
+import queue
+import threading
+import traceback
+
+from pacing import now
+
+
+class CaptureWorker:
+    """
+    Long-lived thread holding a screen context from screen_factory.
+    call()/submit() run functions on it with the context as argument.
+    """
+
+    def __init__(self, screen_factory):
+        self.screen_factory = screen_factory
+        self._tasks = queue.Queue()
+        self._ready = threading.Event()
+        self._sct = None
+        self.warmup_seconds = None
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def submit(self, fn):
+        """Queues fn(sct) on the capture thread. Returns an Event set when it has finished."""
+        done = threading.Event()
+        self._tasks.put((fn, done, None))
+        return done
+
+    def call(self, fn, timeout=10.0):
+        """Runs fn(sct) on the capture thread and returns its result (or raises its exception)."""
+        done = threading.Event()
+        box = {}
+        self._tasks.put((fn, done, box))
+        if not done.wait(timeout):
+            raise TimeoutError("Capture thread is busy")
+        if "error" in box:
+            raise box["error"]
+        return box.get("result")
+
+    def close(self):
+        self._tasks.put(None)
+
+    def _open(self):
+        started = now()
+        try:
+            self._sct = self.screen_factory()
+            # The first grab allocates the capture bitmap; do it before anyone is waiting
+            self._sct.grab(self._sct.monitors[1])
+        except Exception as e:
+            logging.error(f"Capture warm-up failed: {e}")
+            self._sct = None
+        self.warmup_seconds = now() - started
+        logging.info(f"Capture context ready in {self.warmup_seconds * 1000:.0f} ms")
+
+    def _run(self):
+        self._open()
+        self._ready.set()
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            fn, done, box = task
+            try:
+                if self._sct is None:
+                    self._open() # Warm-up failed earlier; retry on demand
+                result = fn(self._sct)
+                if box is not None:
+                    box["result"] = result
+            except Exception as e:
+                if box is not None:
+                    box["error"] = e
+                else:
+                    logging.error(f"Capture task failed: {e}")
+                    logging.error(traceback.format_exc())
+            finally:
+                done.set()
+        if self._sct is not None:
+            self._sct.close()
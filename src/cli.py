@@ -0,0 +1,240 @@
+"""
+Headless command-line entry point: records without the Tk UI (build and test machines, scripts).
+
+    python src/cli.py --duration 10 --output out.mp4
+    python src/cli.py --monitor 2 --fps 30 --duration 60 --output second_screen.mp4
+    python src/cli.py --region 0,0,1280,720 --region 1 --duration 5 --output app.mp4
+    python src/cli.py --schedule jobs.json --json stats.json
+    python src/cli.py --capture file:demo.mp4 --audio wav:demo.wav --duration 5 --output replayed.mp4
+    python src/cli.py --fps 60 --spool --spool-jobs 4 --duration 5 --output burst.mp4
+
+--region takes x,y,w,h or a monitor number and can be repeated (one file per region).
+
+A schedule file is a JSON list of recordings run back-to-back on one recorder: the
+capture context and the audio device list are set up once, and each recording is
+finalized in the background while the next one is already capturing.
+
+    [
+      {"output": "a.mp4", "duration": 10},
+      {"output": "b.mp4", "duration": 5, "monitor": 2, "fps": 30},
+      {"output": "c.mp4", "duration": 5, "region": [0, 0, 1280, 720], "delay": 2},
+      {"output": "d.mp4", "duration": 5, "regions": [[0, 0, 800, 600], 2], "at": "14:30"}
+    ]
+
+delay: seconds to wait after the previous recording; at: local start time (HH:MM[:SS]
+or ISO date-time). Keys left out fall back to the command line options.
+
+The report (per recording: timing, frame and drop counts, see ScreenRecorder.get_stats)
+is printed as JSON to stdout, or written to --json FILE. Exit code 0 if every recording
+succeeded, 1 otherwise.
+"""
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+from utils import set_dpi_awareness
+
+
+def parse_region(text):
+    """"x,y,w,h" -> tuple, or "N" -> monitor number N."""
+    parts = [int(p) for p in str(text).split(",")]
+    if len(parts) == 1:
+        return parts[0]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError(f"Region must be x,y,w,h or a monitor number: {text}")
+    return tuple(parts)
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def parse_start_time(text):
+    """Clock time of the next HH:MM[:SS] (today, or tomorrow if it has passed) or of an ISO date-time."""
+    try:
+        clock = datetime.datetime.strptime(text, "%H:%M:%S" if text.count(":") == 2 else "%H:%M").time()
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    start = datetime.datetime.combine(datetime.date.today(), clock)
+    if start < datetime.datetime.now():
+        start += datetime.timedelta(days=1)
+    return start.timestamp()
+
+
+def load_schedule(path):
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError(f"{path}: expected a JSON list of objects")
+    return entries
+
+
+def numbered(path, index):
+    """a.mp4 -> a_1.mp4, for schedule entries without their own output."""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index + 1}{ext}"
+
+
+def build_recorder(args):
+    """One ScreenRecorder for the whole run, warmed up once."""
+    from recorder import ScreenRecorder
+    rec = ScreenRecorder()
+    rec.encoder_backend = args.encoder
+    rec.monitor_index = args.monitor
+    rec.multiprocess_encoding = args.multiprocess
+    rec.segment_seconds = args.segment_seconds
+    rec.include_microphone = args.mic
+    rec.separate_audio_tracks = args.separate_tracks
+    rec.temp_dir = args.temp_dir
+    rec.spool_capture = args.spool
+    rec.spool_dir = args.spool_dir
+    rec.spool_encode_jobs = args.spool_jobs
+    if args.output_size:
+        rec.output_size = args.output_size
+    rec.capture_backend = f"synthetic:{args.synthetic}" if args.synthetic else args.capture
+    rec.audio_backend = "synthetic" if args.synthetic else args.audio
+    rec.warm_up()
+    return rec
+
+
+def schedule_regions(entry):
+    """Regions of a schedule entry ([x, y, w, h], "x,y,w,h" or monitor numbers), or None."""
+    raw = entry.get("regions") or ([entry["region"]] if entry.get("region") is not None else None)
+    if raw is None:
+        return [int(entry["monitor"])] if "monitor" in entry else None
+    return [parse_region(r) if isinstance(r, str) else tuple(r) if isinstance(r, list) else int(r) for r in raw]
+
+
+def wait(interrupted, seconds):
+    """Sleeps up to seconds; True if Ctrl+C came first. Short slices so the handler runs on Windows too."""
+    end = time.perf_counter() + seconds
+    while not interrupted.is_set():
+        remaining = end - time.perf_counter()
+        if remaining <= 0:
+            return False
+        interrupted.wait(min(remaining, 0.25))
+    return True
+
+
+def run(rec, entries, args, started, interrupted):
+    """Records every entry in turn, appending (entry, FinalizeJob, start_latency) to started."""
+    for i, entry in enumerate(entries):
+        output = entry.get("output") or (numbered(args.output, i) if len(entries) > 1 else args.output)
+        duration = float(entry.get("duration", args.duration or 0))
+        if duration <= 0:
+            raise ValueError(f"Recording {i + 1}: no duration")
+        regions = schedule_regions(entry) or args.region
+
+        if "at" in entry:
+            delay = parse_start_time(entry["at"]) - time.time()
+            if delay > 0:
+                logging.info(f"Recording {i + 1} starts at {entry['at']} (in {delay:.0f}s)")
+        else:
+            delay = float(entry.get("delay", 0))
+        if delay > 0 and wait(interrupted, delay):
+            return
+
+        rec.fps = float(entry.get("fps", args.fps))
+        t = time.perf_counter()
+        rec.start_recording(output, regions=regions or None)
+        start_latency = time.perf_counter() - t
+        logging.info(f"Recording {i + 1}/{len(entries)}: {output}, {duration:g}s")
+        stopped = wait(interrupted, duration - (time.perf_counter() - t))
+        # Finalized in the background; the next recording starts right away
+        started.append((entry, rec.stop_recording_async(), start_latency))
+        if stopped:
+            return
+
+
+def report(rec, started, duration):
+    recordings = []
+    for entry, job, start_latency in started:
+        job.wait()
+        first_frame = job.session.metrics.stages.get("first_frame")
+        recordings.append(dict({
+            "files": job.outputs,
+            "ok": job.ok,
+            "requested_seconds": float(entry.get("duration", duration or 0)),
+            "start_latency_s": round(start_latency, 3),
+            "first_frame_ms": round(first_frame.total * 1000, 1) if first_frame else None,
+        }, **rec.get_stats(job.session)))
+    return {
+        "ok": bool(recordings) and all(r["ok"] for r in recordings),
+        "recordings": recordings,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless screen recorder")
+    parser.add_argument("--region", type=parse_region, action="append",
+                        help="x,y,w,h or a monitor number; repeat for several regions (one file each)")
+    parser.add_argument("--monitor", type=int, default=1, help="Monitor recorded when no region is given (0 = all)")
+    parser.add_argument("--duration", type=float, help="Seconds to record")
+    parser.add_argument("--fps", type=float, default=20.0)
+    parser.add_argument("--output", default="recording.mp4")
+    parser.add_argument("--schedule", help="JSON list of recordings to run back-to-back")
+    parser.add_argument("--encoder", choices=["auto", "ffmpeg", "opencv"], default="auto")
+    parser.add_argument("--output-size", type=parse_size, help="Fit the video inside WxH, e.g. 1920x1080")
+    parser.add_argument("--multiprocess", action="store_true", help="Encode in a separate process")
+    parser.add_argument("--segment-seconds", type=int, default=0, help="Write closed segments of this length")
+    parser.add_argument("--mic", action="store_true", help="Also record the default microphone")
+    parser.add_argument("--separate-tracks", action="store_true", help="One audio track per device")
+    parser.add_argument("--temp-dir", help="Scratch directory for the per-recording temp files (default: system temp)")
+    parser.add_argument("--spool", action="store_true",
+                        help="Capture raw frames to a spool file and encode after stop (short high-fps bursts)")
+    parser.add_argument("--spool-dir", help="Spool directory on a fast local disk (default: the temp dir)")
+    parser.add_argument("--spool-jobs", type=int, default=1, help="Parallel ffmpeg encoders for the spool")
+    parser.add_argument("--capture", default="auto",
+                        help="Frame source: auto (fastest of mss/pil), mss, pil, synthetic[:RES] or file:VIDEO")
+    parser.add_argument("--audio", default="soundcard", help="Audio source: soundcard, synthetic or wav:FILE")
+    parser.add_argument("--synthetic", choices=["720p", "1080p", "1440p", "4k"],
+                        help="Synthetic screen and audio instead of the real ones (smoke tests)")
+    parser.add_argument("--json", help="Write the report to this file instead of stdout")
+    parser.add_argument("--log", help="Log file (default: stderr)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.schedule and not args.duration:
+        parser.error("--duration or --schedule is required")
+    logging.basicConfig(filename=args.log, level=logging.INFO if args.verbose or args.log else logging.WARNING,
+                        format="%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    if sys.platform == "win32":
+        set_dpi_awareness() # Region coordinates are physical pixels
+
+    entries = load_schedule(args.schedule) if args.schedule else [{}]
+    rec = build_recorder(args)
+    started = []
+    # Ctrl+C stops the current recording (which is still finalized) and skips the rest
+    interrupted = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: interrupted.set())
+    try:
+        run(rec, entries, args, started, interrupted)
+        if interrupted.is_set():
+            logging.warning("Interrupted; finishing the recordings made so far.")
+    except Exception as e:
+        logging.error(f"Recording failed: {e}")
+    finally:
+        result = report(rec, started, args.duration) if started else {"ok": False, "recordings": []}
+        rec.cleanup()
+
+    text = json.dumps(result, indent=2, default=str)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    # Needed for the encoder process in a frozen build
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Cached audio device enumeration.
+
+soundcard's import and sc.all_microphones(include_loopback=True) cost hundreds
+of milliseconds on Windows (COM + Media Foundation setup), so the list is
+built once in the background at startup and re-polled every few seconds; the
+recorder reads the cached snapshot instead of enumerating on every START.
+"""
+import logging
+import threading
+
+try:
+    import pythoncom
+except ImportError: # Not on Windows
+    pythoncom = None
+
+_sc = None
+
+
+def soundcard():
+    """Imports soundcard on first use. Returns None if no audio backend is available."""
+    global _sc
+    if _sc is None:
+        try:
+            import soundcard as sc
+            _sc = sc
+        except Exception as e: # No audio backend on this machine (e.g. headless Linux)
+            logging.warning(f"soundcard unavailable: {e}")
+            _sc = False
+    return _sc or None
+
+
+class DeviceSnapshot:
+    """Default speaker/microphone and all (loopback + capture) microphones at one point in time."""
+
+    def __init__(self, default_speaker=None, default_microphone=None, microphones=()):
+        self.default_speaker = default_speaker
+        self.default_microphone = default_microphone
+        self.microphones = list(microphones)
+
+    @property
+    def loopbacks(self):
+        return [m for m in self.microphones if m.isloopback]
+
+    def key(self):
+        """What counts as a device change: the device ids and the defaults."""
+        return (
+            tuple(sorted(str(m.id) for m in self.microphones)),
+            str(self.default_speaker.id) if self.default_speaker else None,
+            str(self.default_microphone.id) if self.default_microphone else None,
+        )
+
+
+def soundcard_snapshot():
+    """Enumerates the soundcard devices now."""
+    sc = soundcard()
+    if sc is None:
+        return DeviceSnapshot()
+    try:
+        microphones = sc.all_microphones(include_loopback=True)
+        speaker = sc.default_speaker()
+        try:
+            microphone = sc.default_microphone()
+        except Exception: # No capture device at all
+            microphone = None
+        return DeviceSnapshot(speaker, microphone, microphones)
+    except Exception as e:
+        logging.error(f"Audio device enumeration failed: {e}")
+        return DeviceSnapshot()
+
+
+class AudioDeviceCache:
+    """
+    Background-refreshed DeviceSnapshot.
+
+    soundcard has no device-change callback, so a daemon thread polls every
+    poll_seconds and swaps in a new snapshot (and calls on_change) only when the
+    device set or a default device changed. invalidate() forces a refresh on the
+    next get(). backend: an audio backend (see backends.py); None = soundcard.
+    """
+
+    def __init__(self, poll_seconds=5.0, on_change=None, backend=None):
+        self.backend = backend
+        self.poll_seconds = poll_seconds
+        self.on_change = on_change
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+
+    def start(self):
+        """Enumerates in the background now and keeps polling."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="audio-devices", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def get(self):
+        """Cached snapshot; enumerates synchronously only if nothing is cached yet."""
+        with self._lock:
+            snapshot = self._snapshot
+        return snapshot if snapshot is not None else self.refresh()
+
+    def refresh(self):
+        """Enumerates the devices now. Returns the new snapshot."""
+        snapshot = self.backend.snapshot() if self.backend else soundcard_snapshot()
+
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = snapshot
+            self.refreshes += 1
+        if previous is not None and previous.key() != snapshot.key():
+            logging.info(f"Audio devices changed: {[m.name for m in snapshot.microphones]}")
+            if self.on_change:
+                self.on_change(snapshot)
+        return snapshot
+
+    def _poll(self):
+        if pythoncom:
+            pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.poll_seconds)
@@ -0,0 +1,369 @@
+import logging
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from audio_writer import PcmConverter
+from frame_ops import BgrConverter, FrameScaler
+
+# Hide the console window ffmpeg would otherwise pop up from the windowed build
+NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+# Long-running encoders get their own process group, so a Ctrl+C in the console
+# (headless CLI) reaches only the recorder, which then closes them cleanly
+DETACHED = {
+    "creationflags": NO_WINDOW | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0),
+    "start_new_session": sys.platform != "win32",
+}
+
+
+def _ebml_size(n):
+    """EBML variable-length size: shortest encoding, all-ones values are reserved."""
+    for length in range(1, 9):
+        if n < (1 << (7 * length)) - 1:
+            return ((1 << (7 * length)) | n).to_bytes(length, "big")
+    raise ValueError(f"EBML size too large: {n}")
+
+
+def _ebml(element_id, payload):
+    return element_id + _ebml_size(len(payload)) + payload
+
+
+def _ebml_uint(element_id, value):
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _matroska_header(width, height, fps):
+    """
+    Head of a minimal Matroska stream of one uncompressed BGRA video track with
+    microsecond timestamps, for ffmpeg to read from a pipe. Frames follow as
+    _matroska_frame_header() + the raw frame.
+    """
+    ebml = _ebml(b"\x1a\x45\xdf\xa3", _ebml_uint(b"\x42\x86", 1) + _ebml_uint(b"\x42\xf7", 1)
+                 + _ebml_uint(b"\x42\xf2", 4) + _ebml_uint(b"\x42\xf3", 8)
+                 + _ebml(b"\x42\x82", b"matroska") + _ebml_uint(b"\x42\x87", 4) + _ebml_uint(b"\x42\x85", 2))
+    info = _ebml(b"\x15\x49\xa9\x66", _ebml_uint(b"\x2a\xd7\xb1", 1000)) # Timestamps in microseconds
+    video = _ebml_uint(b"\xb0", width) + _ebml_uint(b"\xba", height) + _ebml(b"\x2e\xb5\x24", b"BGRA")
+    track = _ebml(b"\xae", _ebml_uint(b"\xd7", 1) + _ebml_uint(b"\x73\xc5", 1) + _ebml_uint(b"\x83", 1)
+                  # Default frame duration one slot, so the last frame isn't stretched to the previous gap
+                  + _ebml_uint(b"\x23\xe3\x83", round(1e9 / fps))
+                  + _ebml(b"\x86", b"V_UNCOMPRESSED") + _ebml(b"\xe0", video))
+    # Segment of unknown size: the stream ends when the pipe closes
+    segment = b"\x18\x53\x80\x67" + b"\x01\xff\xff\xff\xff\xff\xff\xff"
+    return ebml + segment + info + _ebml(b"\x16\x54\xae\x6b", track)
+
+
+def _matroska_frame_header(timestamp_us, frame_bytes):
+    """A cluster holding one keyframe of frame_bytes, up to where the frame data starts."""
+    block = b"\x81" + struct.pack(">hB", 0, 0x80) # Track 1, no offset from the cluster time, keyframe
+    cluster = _ebml_uint(b"\xe7", timestamp_us) + b"\xa3" + _ebml_size(len(block) + frame_bytes) + block
+    return b"\x1f\x43\xb6\x75" + _ebml_size(len(cluster) + frame_bytes) + cluster
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def concat_segments(list_path, output):
+    """
+    Joins the segments listed in an ffconcat manifest into one MP4 by stream copy
+    (no re-encode). Returns True on success.
+    """
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+           "-f", "concat", "-safe", "0", "-i", list_path,
+           "-c", "copy", output]
+    logging.info(f"Running command: {' '.join(cmd)}")
+    result = subprocess.run(cmd, capture_output=True, text=True, creationflags=NO_WINDOW)
+    if result.returncode != 0:
+        logging.error(f"Segment concat failed with code {result.returncode}: {result.stderr}")
+        return False
+    return True
+
+
+def write_concat_list(paths, list_path):
+    """Writes an ffconcat manifest of paths (in that order) for concat_segments."""
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def trim_output(path, start, end):
+    """
+    Cuts an MP4 to [start, end] seconds in place by stream copy (no re-encode).
+    Video is cut at the keyframe at or before start. Returns True on success.
+    """
+    root, ext = os.path.splitext(path)
+    trimmed = f"{root}.trim{ext}"
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+           "-ss", f"{start:.3f}", "-i", path, "-t", f"{end - start:.3f}",
+           "-map", "0", "-c", "copy", trimmed]
+    logging.info(f"Running command: {' '.join(cmd)}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, creationflags=NO_WINDOW)
+    except OSError as e:
+        logging.error(f"Trim failed: {e}")
+        return False
+    if result.returncode != 0:
+        logging.error(f"Trim failed with code {result.returncode}: {result.stderr}")
+        if os.path.exists(trimmed):
+            os.remove(trimmed)
+        return False
+    os.replace(trimmed, path)
+    return True
+
+
+class OpenCVEncoder:
+    """
+    Legacy backend: OpenCV mp4v writer producing a silent video.
+    Audio goes to a separate WAV and is muxed after stop.
+    output_size (w, h) downscales frames (area interpolation) before conversion.
+    """
+    has_audio = False
+
+    def __init__(self, path, width, height, fps, metrics=None, output_size=None):
+        import cv2
+        self.path = path
+        output_size = tuple(output_size) if output_size else (width, height)
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v") # Better compat than XVID for some players
+        self._out = cv2.VideoWriter(path, fourcc, fps, output_size)
+        # Scale the BGRA frame first so the color conversion runs on the small frame
+        self._scaler = FrameScaler(output_size) if output_size != (width, height) else None
+        self._converter = BgrConverter()
+        self._metrics = metrics
+        self._last = None # Last converted BGR frame, reused by repeat()
+        self.frames = 0
+        self.repeated = 0
+
+    def write(self, frame):
+        """frame: BGRA uint8 array (height, width, 4)"""
+        if self._scaler:
+            if self._metrics:
+                with self._metrics.stage("scale"):
+                    frame = self._scaler.scale(frame)
+            else:
+                frame = self._scaler.scale(frame)
+        if self._metrics:
+            with self._metrics.stage("convert"):
+                self._last = self._converter.convert(frame)
+        else:
+            self._last = self._converter.convert(frame)
+        self._out.write(self._last)
+        self.frames += 1
+
+    def repeat(self):
+        """Writes the previous frame again without converting it."""
+        self._out.write(self._last)
+        self.frames += 1
+        self.repeated += 1
+
+    def close(self):
+        self._out.release()
+        return True
+
+
+class SocketAudioSink:
+    """Streams int16 PCM to an ffmpeg audio input over a local socket."""
+
+    def __init__(self, conn, samplerate, channels):
+        self._conn = conn
+        self.samplerate = samplerate
+        self.channels = channels
+        self.converter = PcmConverter(channels)
+
+    def write(self, block):
+        pcm = self.converter.convert(block)
+        self._conn.sendall(pcm)
+
+    def write_silence(self, frames):
+        self.write(np.zeros((frames, self.channels), dtype=np.float32))
+
+    @property
+    def frames(self):
+        return self.converter.frames
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FFmpegEncoder:
+    """
+    Single-pass backend: one ffmpeg process started with the recording.
+    Raw BGRA frames are written to its stdin (ffmpeg does the pixel conversion)
+    and int16 PCM arrives on a second input, so the final MP4 is produced
+    directly without temp files or a merge step after stop.
+
+    Frames go in a minimal Matroska stream, each stamped with its slot on the
+    constant frame rate timeline. repeat() therefore writes nothing: ffmpeg's fps
+    filter fills the slot by duplicating the previous frame after the pixel
+    conversion, so a lower capture rate really lowers the encoder's load.
+
+    The audio input is a loopback TCP socket rather than an OS pipe, which
+    works the same way on Windows and POSIX. With audio_tracks > 1 there is
+    one socket per track and each becomes its own audio stream in the MP4.
+    ffmpeg only connects input N+1 once input N has delivered data, so open
+    and feed the tracks in order.
+
+    output_size (w, h) has ffmpeg downscale (area filter) before encoding;
+    frames are still written at capture size.
+
+    With segment_seconds set, path is a directory: ffmpeg writes closed,
+    playable segment_NNNNN.mp4 files of that length plus a segments.ffconcat
+    manifest as it goes (see concat_segments).
+    """
+
+    def __init__(self, path, width, height, fps, preset="veryfast", crf=23,
+                 samplerate=None, channels=None, segment_seconds=None, audio_tracks=1, output_size=None):
+        self.path = path
+        self.fps = fps
+        self._last = None
+        self._sent = -1 # Slot of the last frame written to the pipe
+        self.frames = 0
+        self.repeated = 0
+        self.has_audio = samplerate is not None
+        self.samplerate = samplerate
+        self.channels = channels
+        self.audio_tracks = audio_tracks if self.has_audio else 0
+        self._listeners = [] # Per track; None once accepted
+        self._audio_sinks = []
+        self._stderr_lines = []
+
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "matroska", "-thread_queue_size", "64",
+            # Size and format are in the stream header; nothing to probe
+            "-probesize", "32", "-analyzeduration", "0",
+            "-i", "pipe:0",
+        ]
+        if self.has_audio:
+            for _ in range(self.audio_tracks):
+                listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                listener.bind(("127.0.0.1", 0))
+                listener.listen(1)
+                self._listeners.append(listener)
+                cmd += [
+                    "-f", "s16le", "-ar", str(samplerate), "-ac", str(channels),
+                    "-thread_queue_size", "1024",
+                    # Raw PCM needs no probing; the default would wait for seconds of audio before encoding
+                    "-probesize", "32", "-analyzeduration", "0",
+                    "-i", f"tcp://127.0.0.1:{listener.getsockname()[1]}",
+                ]
+            cmd += ["-map", "0:v"]
+            for track in range(self.audio_tracks):
+                cmd += ["-map", f"{track + 1}:a"]
+            cmd += ["-c:a", "aac"]
+        # yuv420p needs even dimensions; fps comes last so the repeated slots skip the conversion
+        video_filter = f"crop=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p,fps={fps}"
+        if output_size and tuple(output_size) != (width, height):
+            video_filter = f"scale={output_size[0]}:{output_size[1]}:flags=area," + video_filter
+        cmd += [
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            "-vf", video_filter,
+            "-pix_fmt", "yuv420p",
+        ]
+        self.segment_list = None
+        if segment_seconds:
+            # Keyframe on every boundary so segments cut exactly and concat cleanly
+            self.segment_list = os.path.join(path, "segments.ffconcat")
+            cmd += [
+                "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+                "-f", "segment", "-segment_time", str(segment_seconds),
+                "-segment_format", "mp4", "-reset_timestamps", "1",
+                "-segment_list", self.segment_list, "-segment_list_type", "ffconcat",
+                os.path.join(path, "segment_%05d.mp4"),
+            ]
+        else:
+            cmd += ["-movflags", "+faststart", path]
+        logging.info(f"Starting encoder: {' '.join(cmd)}")
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.PIPE, **DETACHED)
+        # Drain stderr so ffmpeg can never block on a full pipe
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+        self._proc.stdin.write(_matroska_header(width, height, fps))
+
+    def _read_stderr(self):
+        for line in iter(self._proc.stderr.readline, b""):
+            line = line.decode(errors="replace").rstrip()
+            if line:
+                self._stderr_lines.append(line)
+                logging.warning(f"ffmpeg: {line}")
+
+    def write(self, frame):
+        """frame: contiguous BGRA uint8 array (height, width, 4), must stay valid until the next write"""
+        self._send(frame, self.frames)
+        self._last = frame
+        self.frames += 1
+
+    def repeat(self):
+        """Repeats the previous frame in the next slot. Nothing is piped: ffmpeg duplicates it."""
+        self.frames += 1
+        self.repeated += 1
+
+    def _send(self, frame, slot):
+        self._proc.stdin.write(_matroska_frame_header(round(slot * 1000000 / self.fps), frame.nbytes))
+        self._proc.stdin.write(frame.data)
+        self._sent = slot
+
+    def open_audio(self, timeout=10.0, track=0):
+        """Waits for ffmpeg to connect to audio input `track` and returns a sink for it."""
+        if not self.has_audio:
+            return None
+        listener = self._listeners[track]
+        listener.settimeout(timeout)
+        conn, _ = listener.accept()
+        listener.close()
+        self._listeners[track] = None
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Room for a whole audio block while ffmpeg is still opening the next track's input
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+        sink = SocketAudioSink(conn, self.samplerate, self.channels)
+        self._audio_sinks.append(sink)
+        return sink
+
+    def close(self):
+        """Ends all inputs and waits for ffmpeg to finish the file. Returns True on success."""
+        for sink in self._audio_sinks:
+            sink.close()
+        for track, listener in enumerate(self._listeners):
+            if listener is None:
+                continue
+            # Audio thread never attached this track: give ffmpeg an empty audio stream
+            try:
+                self.open_audio(timeout=2.0, track=track).close()
+            except Exception as e:
+                logging.error(f"Failed to close unused audio input {track}: {e}")
+                listener.close()
+                self._listeners[track] = None
+        try:
+            if self._last is not None and self._sent < self.frames - 1:
+                # Trailing repeats: the fps filter only duplicates up to the last frame it got
+                self._send(self._last, self.frames - 1)
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        code = self._proc.wait()
+        self._stderr_thread.join(timeout=1.0)
+        if code != 0:
+            logging.error(f"FFmpeg encoder failed with code {code}")
+            return False
+        logging.info(f"Encoder finished. Frames: {self.frames}, saved to {self.path}")
+        return True
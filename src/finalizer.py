@@ -0,0 +1,224 @@
+"""
+Background finalization: after STOP the capture threads are released at once
+and the slow part (draining the encoder, ffmpeg mux/concat, temp cleanup)
+runs as a FinalizeJob on a worker thread, so the UI stays responsive and the
+next recording can start while earlier ones are still being written.
+
+Final files are written under a .partial name next to where they end up and
+renamed into place, so a half-written file never shows under the final name
+and nothing is copied between volumes when the destination is already known.
+"""
+import logging
+import os
+import queue
+import shutil
+import threading
+import traceback
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def partial_path(path):
+    """a.mp4 -> a.partial.mp4: where a final file is written before it is renamed into place."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial{ext}"
+
+
+def numbered_path(path, index):
+    """File of the index-th output saved as path: path itself, then name_2.mp4, name_3.mp4, ..."""
+    if index == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index + 1}{ext}"
+
+
+def place_file(src, dst):
+    """
+    Moves src to dst, replacing it. A rename on the same volume; across volumes the copy
+    goes to dst's .partial name first, so dst only ever appears complete.
+    """
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    try:
+        os.replace(src, dst)
+        return
+    except OSError:
+        pass # Other volume
+    logging.warning(f"Copying {src} to another volume: {dst}")
+    partial = partial_path(dst)
+    shutil.move(src, partial)
+    os.replace(partial, dst)
+
+
+class FinalizeJob:
+    """
+    One stopped recording waiting to be finalized.
+
+    work(job) does the finalization, reports progress through job.update() and
+    returns True on success. on_progress(job) / on_done(job) are called from the
+    worker thread (hand them to the UI thread, e.g. with root.after).
+    outputs are the files it produces (several for multi-region recordings).
+    session is whatever is being finalized; the queue never looks at it.
+
+    save_as(path) / discard() may be called at any time, e.g. once a save dialog
+    closes. Before the outputs are written, work picks the destination up through
+    output_path() and writes there directly; later, the finished files are moved.
+    temp_dirs are removed at the end if empty (anything kept for recovery stays).
+    """
+
+    def __init__(self, name, work, outputs=(), temp_files=(), session=None, on_progress=None, on_done=None,
+                 temp_dirs=()):
+        self.name = name
+        self.outputs = list(outputs)
+        self.session = session
+        self.temp_files = list(temp_files) # Owned by this job; removed when it ends
+        self.temp_dirs = list(temp_dirs)
+        self.destination = None # Set by save_as()
+        self.discarded = False
+        self._lock = threading.Lock()
+        self.state = QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.ok = False
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self._work = work
+        self._finished = threading.Event()
+
+    @property
+    def output(self):
+        """The main output file, or None."""
+        return self.outputs[0] if self.outputs else None
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def output_path(self, index, default):
+        """Where work writes output index: numbered after the save_as() path if there is one yet, else default."""
+        with self._lock:
+            return numbered_path(self.destination, index) if self.destination else default
+
+    def save_as(self, path):
+        """Saves the outputs as path (extra regions as name_2.mp4, ...); moves them now if the job is done."""
+        with self._lock:
+            self.destination = path
+            if self.done:
+                self._deliver()
+
+    def discard(self):
+        """Deletes the outputs (now, or as soon as the job is done)."""
+        with self._lock:
+            self.discarded = True
+            if self.done:
+                self._deliver()
+
+    def _deliver(self):
+        """Moves (or deletes) the finished outputs per save_as()/discard(). Called with the lock held."""
+        if self.discarded:
+            for path in self.outputs:
+                if os.path.exists(path):
+                    os.remove(path)
+        elif self.destination:
+            for i, path in enumerate(self.outputs):
+                target = numbered_path(self.destination, i)
+                if os.path.exists(path):
+                    place_file(path, target)
+                self.outputs[i] = target
+        self._remove_temp_dirs()
+
+    def update(self, stage, progress):
+        self.stage = stage
+        self.progress = max(0.0, min(1.0, progress))
+        if self.on_progress:
+            try:
+                self.on_progress(self)
+            except Exception as e:
+                logging.error(f"Finalize progress callback failed: {e}")
+
+    def run(self):
+        self.state = RUNNING
+        logging.info(f"Finalizing {self.name}...")
+        try:
+            self.ok = bool(self._work(self))
+        except Exception as e:
+            logging.error(f"Finalizing {self.name} failed: {e}")
+            logging.error(traceback.format_exc())
+            self.ok = False
+        finally:
+            self._remove_temp_files()
+            # Under the lock: a save_as() either lands before this delivery or sees the job done
+            with self._lock:
+                try:
+                    self._deliver()
+                except OSError as e:
+                    logging.error(f"Could not save {self.name} as {self.destination}: {e}")
+                    self.ok = False
+                self.state = DONE if self.ok else FAILED
+                self.stage = self.state
+                self.progress = 1.0
+                self._finished.set()
+            logging.info(f"Finalize {self.name}: {self.state}")
+            if self.on_done:
+                try:
+                    self.on_done(self)
+                except Exception as e:
+                    logging.error(f"Finalize done callback failed: {e}")
+        return self.ok
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def _remove_temp_files(self):
+        for path in self.temp_files:
+            if os.path.exists(path):
+                try: os.remove(path)
+                except OSError as e: logging.warning(f"Could not remove {path}: {e}")
+
+    def _remove_temp_dirs(self):
+        for path in self.temp_dirs:
+            try:
+                os.rmdir(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logging.info(f"Kept {path}: it still holds files")
+
+
+class FinalizeQueue:
+    """Runs FinalizeJobs one after another on a single background thread."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.jobs = []
+
+    def submit(self, job):
+        with self._lock:
+            self.jobs = [j for j in self.jobs if not j.done] + [job]
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="finalizer", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def pending(self):
+        """Jobs queued or still running."""
+        with self._lock:
+            return [j for j in self.jobs if not j.done]
+
+    def wait(self, timeout=None):
+        """Waits for every pending job. Returns False if some are still running after timeout."""
+        for job in self.pending():
+            if not job.wait(timeout):
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.run()
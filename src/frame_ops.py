@@ -0,0 +1,124 @@
+import numpy as np
+
+
+def bgra_view(shot):
+    """
+    Wraps an mss ScreenShot's raw BGRA buffer as a (height, width, 4) array without copying.
+    np.array(shot) would copy the whole frame first.
+    """
+    return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+
+def scaled_size(width, height, scale=1.0, target=None):
+    """
+    Output size for a width x height capture: fitted inside target (w, h) keeping
+    the aspect ratio, else multiplied by scale. Never upscales. Scaled sizes are
+    even, as yuv420p needs.
+    """
+    factor = min(target[0] / width, target[1] / height) if target else scale
+    if factor >= 1.0:
+        return width, height
+    return max(2, int(width * factor) // 2 * 2), max(2, int(height * factor) // 2 * 2)
+
+
+class FrameScaler:
+    """Area-interpolated downscale into one preallocated output array, reused for every frame."""
+
+    def __init__(self, size):
+        import cv2
+        self._cv2 = cv2
+        self.size = tuple(size) # (width, height)
+        self._dst = None
+
+    def scale(self, frame):
+        """Returns the scaled frame. The array is overwritten by the next call."""
+        w, h = self.size
+        if self._dst is None or self._dst.shape[2:] != frame.shape[2:]:
+            self._dst = np.empty((h, w) + frame.shape[2:], dtype=np.uint8)
+        self._cv2.resize(frame, self.size, dst=self._dst, interpolation=self._cv2.INTER_AREA)
+        return self._dst
+
+
+class BgrConverter:
+    """BGRA -> BGR conversion into one preallocated output array, reused for every frame."""
+
+    def __init__(self):
+        import cv2
+        self._cv2 = cv2
+        self._dst = None
+
+    def convert(self, frame):
+        """Returns the converted frame. The array is overwritten by the next call."""
+        h, w = frame.shape[:2]
+        if self._dst is None or self._dst.shape[:2] != (h, w):
+            self._dst = np.empty((h, w, 3), dtype=np.uint8)
+        self._cv2.cvtColor(frame, self._cv2.COLOR_BGRA2BGR, dst=self._dst)
+        return self._dst
+
+
+class ChangeDetector:
+    """
+    Cheap "did the screen change?" test for BGRA frames.
+
+    Compares the frame (as packed 32-bit pixels) against the previous one, using
+    preallocated buffers so an idle screen costs one compare per tick and no
+    allocations. Every row is compared by default: a change confined to rows that
+    are skipped, such as a 1 px caret, underline or cursor line, would be taken
+    for a static frame and never recorded. row_step > 1 trades that for speed.
+    """
+
+    def __init__(self, row_step=1):
+        self.row_step = max(1, int(row_step))
+        self._prev = None
+        self._diff = None
+        self.checked = 0
+        self.unchanged = 0
+
+    def _sample(self, frame):
+        # (h, w, 4) uint8 -> (h / step, w) uint32 view, no copy
+        return frame[::self.row_step].view(np.uint32)[..., 0]
+
+    def changed(self, frame):
+        """Returns True if frame differs from the last frame passed in, and remembers it."""
+        sample = self._sample(frame)
+        self.checked += 1
+        if self._prev is None or self._prev.shape != sample.shape:
+            self._prev = sample.copy()
+            self._diff = np.empty(sample.shape, dtype=bool)
+            return True
+
+        np.not_equal(sample, self._prev, out=self._diff)
+        if not self._diff.any():
+            self.unchanged += 1
+            return False
+        np.copyto(self._prev, sample)
+        return True
+
+
+class PreviewTap:
+    """
+    Latest-frame slot for a live preview, fed by the capture loop.
+
+    offer() is called with every grabbed frame but only keeps one every
+    `interval` seconds: an RGB, strided subsample fitting max_size. That is a
+    copy the size of the preview, so the capture loop pays a few hundred
+    microseconds per kept frame and nothing for the others. There is no queue;
+    a slow or absent reader just sees the newest frame.
+    """
+
+    def __init__(self, max_size=(320, 240), interval=0.25):
+        self.max_size = tuple(max_size)
+        self.interval = interval
+        self.frame = None # (h, w, 3) RGB uint8, replaced (never modified) by offer()
+        self.frame_time = None
+        self.frames = 0
+
+    def offer(self, frame, timestamp):
+        if self.frame_time is not None and timestamp - self.frame_time < self.interval:
+            return
+        h, w = frame.shape[:2]
+        step = max(1, -(-w // self.max_size[0]), -(-h // self.max_size[1])) # Ceil: never above max_size
+        # Every step-th pixel, channels reversed: BGRA -> RGB in the same pass
+        self.frame = np.ascontiguousarray(frame[::step, ::step, 2::-1])
+        self.frame_time = timestamp
+        self.frames += 1
@@ -0,0 +1,103 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+# Drop policies for FrameRing.put()
+DROP_OLDEST = "drop-oldest"  # Overwrite the oldest queued frame, capture never waits
+BLOCK = "block"              # Capture waits for the encoder to free a slot
+
+
+class FrameRing:
+    """
+    Bounded ring of preallocated frame buffers shared by the capture thread
+    (producer) and the encoder thread (consumer).
+
+    Slots are allocated once, so the capture loop never allocates frame-sized
+    arrays. A slot index travels capture -> queued -> encoder -> free.
+    """
+
+    def __init__(self, width, height, depth=8, policy=DROP_OLDEST, channels=4):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.depth = max(2, int(depth))
+        self.policy = policy
+        self.slots = [np.empty((height, width, channels), dtype=np.uint8) for _ in range(self.depth)]
+
+        self._free = deque(range(self.depth))
+        self._queued = deque()  # (slot index, timestamp)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stop_time = None # Set by the recorder at stop; the encoder pads the stream up to it
+
+        # Counters
+        self.frames_in = 0
+        self.frames_out = 0
+        self.dropped_frames = 0
+
+    def acquire(self):
+        """
+        Producer side: returns a free slot index to fill, or None if the ring was closed.
+        With DROP_OLDEST the oldest queued frame is discarded when no slot is free.
+        """
+        with self._cond:
+            while not self._free:
+                if self._closed:
+                    return None
+                if self.policy == DROP_OLDEST and self._queued:
+                    index, _ = self._queued.popleft()
+                    self.dropped_frames += 1
+                    return index
+                self._cond.wait(0.1)
+            return self._free.popleft()
+
+    def commit(self, index, timestamp):
+        """Producer side: hands a filled slot to the encoder."""
+        with self._cond:
+            self._queued.append((index, timestamp))
+            self.frames_in += 1
+            self._cond.notify_all()
+
+    def put(self, frame, timestamp):
+        """Copies frame into a free slot and queues it. Returns False if the ring is closed."""
+        index = self.acquire()
+        if index is None:
+            return False
+        np.copyto(self.slots[index], frame)
+        self.commit(index, timestamp)
+        return True
+
+    def get(self, timeout=None):
+        """
+        Consumer side: returns (index, frame, timestamp) for the oldest queued frame.
+        Returns None on timeout, or once the ring is closed and fully drained.
+        The caller must release(index) when done with the frame.
+        """
+        with self._cond:
+            if not self._queued and not self._closed:
+                self._cond.wait(timeout)
+            if not self._queued:
+                return None
+            index, timestamp = self._queued.popleft()
+            self.frames_out += 1
+            return index, self.slots[index], timestamp
+
+    def release(self, index):
+        """Consumer side: returns a slot to the free list."""
+        with self._cond:
+            self._free.append(index)
+            self._cond.notify_all()
+
+    def close(self):
+        """Stops accepting frames. Already queued frames can still be drained with get()."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def qsize(self):
+        with self._cond:
+            return len(self._queued)
@@ -28,6 +28,9 @@ def main():
                 recorder_wrapper['instance'].stop_recording()
             except:
                 pass
+        if recorder_wrapper['instance']:
+            # Waits for recordings still being finalized in the background
+            recorder_wrapper['instance'].cleanup()
         # Force kill if needed by system
         os._exit(0)
     
@@ -42,6 +45,8 @@ def main():
             logging.info("Recorder module imported.")
             
             rec = ScreenRecorder()
+            # Capture context and audio device list get ready while the user picks a region
+            rec.warm_up()
             logging.info("Recorder initialized.")
             
             recorder_wrapper['instance'] = rec
@@ -70,4 +75,7 @@ def main():
         on_app_cleanup()
 
 if __name__ == "__main__":
+    # Needed for the encoder process in the frozen (PyInstaller) build
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from pacing import now
+
+
+class StageTimer:
+    """Running count/total/max of one pipeline stage, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        avg = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(avg * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "total_s": round(self.total, 3),
+        }
+
+
+class RecordingMetrics:
+    """
+    Per-recording instrumentation shared by the capture, encoder and audio threads.
+
+    Stages (grab, queue, convert, write, audio_block, ...) accumulate timings,
+    counters accumulate events (frames, overruns, ...). live() gives rates since
+    the previous call for the UI readout; summary() is what gets saved as JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.started = now()
+        self.ended = None
+        self._live_time = self.started
+        self._live_counters = {}
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            timer = self.stages.get(stage)
+            if timer is None:
+                timer = self.stages[stage] = StageTimer()
+            timer.add(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = now()
+        try:
+            yield
+        finally:
+            self.add_time(name, now() - start)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def get(self, name):
+        return self.counters.get(name, 0)
+
+    def total(self, stage):
+        timer = self.stages.get(stage)
+        return timer.total if timer else 0.0
+
+    def live(self):
+        """Counter rates (per second) since the previous live() call, plus the latest stage timings."""
+        with self._lock:
+            current = now()
+            elapsed = max(current - self._live_time, 1e-6)
+            rates = {name: (value - self._live_counters.get(name, 0)) / elapsed
+                     for name, value in self.counters.items()}
+            self._live_time = current
+            self._live_counters = dict(self.counters)
+            last_ms = {name: timer.last * 1000 for name, timer in self.stages.items()}
+        return {"rates": rates, "last_ms": last_ms, "counters": dict(self.counters)}
+
+    def absorb(self, summary):
+        """Adds stage timings and counters from another summary() (e.g. from the encoder process)."""
+        with self._lock:
+            for name, data in summary.get("stages", {}).items():
+                timer = self.stages.get(name)
+                if timer is None:
+                    timer = self.stages[name] = StageTimer()
+                timer.count += data["count"]
+                timer.total += data["total_s"]
+                timer.max = max(timer.max, data["max_ms"] / 1000)
+            for name, value in summary.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        """Freezes the duration reported by summary()."""
+        self.ended = now()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "duration_s": round((self.ended or now()) - self.started, 3),
+                "stages": {name: timer.as_dict() for name, timer in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def write_json(self, path, extra=None):
+        data = self.summary()
+        if extra:
+            data.update(extra)
+        try:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+            logging.info(f"Metrics written to {path}")
+        except Exception as e:
+            logging.error(f"Failed to write metrics {path}: {e}")
@@ -0,0 +1,187 @@
+"""
+Multi-process encoding: the capture thread copies frames into shared memory
+slots and an encoder worker process paces, converts and encodes them.
+Only slot indices and timestamps cross the process boundary, so the encoder's
+Python work no longer competes with capture for the GIL.
+"""
+import logging
+import multiprocessing as mp
+import queue
+import signal
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_queue import DROP_OLDEST, BLOCK
+
+_STOP = None # Sentinel on the filled queue
+
+
+class SharedFrameRing:
+    """
+    FrameRing-compatible producer side backed by one shared memory block.
+    The consumer is encode_worker() in another process.
+    """
+
+    def __init__(self, width, height, depth=8, policy=DROP_OLDEST, channels=4, ctx=None):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        ctx = ctx or mp.get_context("spawn")
+        self.depth = max(2, int(depth))
+        self.policy = policy
+        self.shape = (self.depth, height, width, channels)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        self.slots = np.ndarray(self.shape, dtype=np.uint8, buffer=self._shm.buf)
+
+        self.free_q = ctx.Queue()
+        self.filled_q = ctx.Queue()
+        for i in range(self.depth):
+            self.free_q.put(i)
+        self.stop_time = ctx.Value("d", 0.0)
+        self.t0 = ctx.Value("d", 0.0) # Timeline origin, set by the capture thread before the first put
+        self._frames_out = ctx.Value("L", 0) # Incremented by the worker
+        self._closed = False
+
+        self.frames_in = 0
+        self.dropped_frames = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def frames_out(self):
+        return self._frames_out.value
+
+    def worker_args(self):
+        return (self._shm.name, self.shape, self.free_q, self.filled_q, self.stop_time, self.t0, self._frames_out)
+
+    def acquire(self):
+        """Returns a free slot index, or None once closed. See FrameRing.acquire()."""
+        while not self._closed:
+            try:
+                return self.free_q.get(timeout=0.005)
+            except queue.Empty:
+                pass
+            if self.policy == DROP_OLDEST:
+                # Take back the oldest frame the worker hasn't picked up yet
+                try:
+                    index, _ = self.filled_q.get_nowait()
+                    self.dropped_frames += 1
+                    return index
+                except queue.Empty:
+                    pass # Worker holds every slot right now
+        return None
+
+    def put(self, frame, timestamp):
+        index = self.acquire()
+        if index is None:
+            return False
+        np.copyto(self.slots[index], frame)
+        self.filled_q.put((index, timestamp))
+        self.frames_in += 1
+        return True
+
+    def qsize(self):
+        try:
+            return self.filled_q.qsize()
+        except NotImplementedError: # macOS
+            return 0
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.filled_q.put(_STOP)
+
+    def release_memory(self):
+        """Frees the shared block once the worker has exited."""
+        self.slots = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def encode_worker(ring_args, config, result_q):
+    """
+    Worker process entry point: pace, convert and encode frames from the shared ring.
+    config: dict(backend, path, width, height, fps, preset, crf, output_size).
+    Puts a result dict (pacing report, metrics summary, ok) on result_q when done.
+    """
+    from encoders import FFmpegEncoder, OpenCVEncoder
+    from metrics import RecordingMetrics
+    from pacing import FramePacer
+
+    # Ctrl+C is the parent's to handle: it stops capture and lets this worker finish the file
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Append to the recorder's app.log (if any) instead of clearing it
+    logging.basicConfig(filename=config.get("log_file"), level=logging.INFO,
+                        format="%(asctime)s - %(levelname)s - [encoder] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    shm_name, shape, free_q, filled_q, stop_time, t0, frames_out = ring_args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    metrics = RecordingMetrics()
+    pacer = FramePacer(config["fps"])
+    result = {"ok": False}
+    out = None
+    held = None
+
+    try:
+        width, height, fps = config["width"], config["height"], config["fps"]
+        if config["backend"] == "ffmpeg":
+            # Video only: audio is muxed in by the recorder afterwards
+            out = FFmpegEncoder(config["path"], width, height, fps, preset=config["preset"], crf=config["crf"],
+                                output_size=config.get("output_size"))
+        else:
+            out = OpenCVEncoder(config["path"], width, height, fps, metrics=metrics,
+                                output_size=config.get("output_size"))
+
+        while True:
+            item = filled_q.get()
+            if item is _STOP:
+                break
+            index, stamp = item
+            if pacer.t0 is None:
+                # The recording's first grab, not the first frame that got here (see VideoOutput.start_timeline)
+                pacer.t0 = t0.value or stamp
+            with frames_out.get_lock():
+                frames_out.value += 1
+            repeat, emit = pacer.place(stamp)
+            if not emit:
+                free_q.put(index)
+                continue
+            for _ in range(repeat):
+                out.repeat()
+            with metrics.stage("write"):
+                out.write(slots[index])
+            for _ in range(emit - 1):
+                out.repeat()
+            metrics.count("frames_written", repeat + emit)
+            if held is not None:
+                free_q.put(held)
+            held = index
+
+        if held is not None:
+            tail = pacer.finish(stop_time.value)
+            for _ in range(tail):
+                out.repeat()
+            metrics.count("frames_written", tail)
+        result["ok"] = True
+    except Exception as e:
+        logging.error(f"Encoder worker failed: {e}")
+    finally:
+        if out is not None:
+            result["ok"] = out.close() and result["ok"]
+            result["frames"] = out.frames
+        metrics.finish()
+        result["pacing"] = pacer.report(stop_time.value or None)
+        result["metrics"] = metrics.summary()
+        slots = None
+        shm.close()
+        result_q.put(result)
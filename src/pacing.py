@@ -0,0 +1,194 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+
+def now():
+    """Monotonic, high resolution clock shared by capture, encoder and audio threads."""
+    return time.perf_counter()
+
+
+class CaptureClock:
+    """
+    Deadline scheduler for the capture loop.
+    Ticks are fixed at start + n / fps instead of sleeping "1/fps - elapsed",
+    so a slow grab delays only that tick and the loop catches up afterwards.
+    """
+
+    def __init__(self, fps, start=None):
+        self.fps = fps
+        self.start = now() if start is None else start
+        self.tick = 0
+        self.skipped_ticks = 0
+
+    def wait(self):
+        """Sleeps until the next tick. Ticks already missed are skipped, not bunched up."""
+        self.tick += 1
+        deadline = self.start + self.tick / self.fps
+        current = now()
+        if current > deadline:
+            # Running late: jump to the next tick in the future
+            behind = int((current - deadline) * self.fps) + 1
+            self.skipped_ticks += behind
+            self.tick += behind
+            deadline = self.start + self.tick / self.fps
+        time.sleep(max(0.0, deadline - now()))
+
+    def set_fps(self, fps):
+        """Changes the tick rate from the current tick on, without bunching or skipping ticks."""
+        self.start += self.tick / self.fps
+        self.tick = 0
+        self.fps = fps
+
+
+class FramePacer:
+    """
+    Maps timestamped captures onto a constant frame rate timeline.
+
+    Output frame n covers [t0 + n / fps, t0 + (n + 1) / fps). A capture landing
+    in a later slot than expected fills the gap by repeating the previous frame;
+    a second capture in an already written slot is dropped. The video therefore
+    always lasts as long as the wall-clock recording and stays in step with audio.
+    """
+
+    def __init__(self, fps, t0=None):
+        self.fps = fps
+        self.t0 = t0
+        self.next_slot = 0
+        self.captured = 0
+        self.emitted = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.max_lag = 0.0 # Worst delay between a frame's slot start and its capture
+        self.first_stamp = None # Capture time of the first frame placed
+
+    def place(self, timestamp):
+        """
+        Returns (repeat_previous, emit_count) for a frame captured at timestamp:
+        write the previous frame repeat_previous times, then this frame emit_count times
+        (0 if it is dropped; more than 1 only for the very first frame).
+        """
+        if self.t0 is None:
+            self.t0 = timestamp
+        if self.first_stamp is None:
+            self.first_stamp = timestamp
+        self.captured += 1
+        slot = math.floor((timestamp - self.t0) * self.fps)
+        if slot < self.next_slot:
+            self.dropped += 1
+            return 0, 0
+
+        repeat = slot - self.next_slot
+        if self.emitted == 0:
+            # Nothing to repeat yet: the first frame also covers the leading gap
+            repeat, emit_count = 0, repeat + 1
+        else:
+            emit_count = 1
+        self.max_lag = max(self.max_lag, timestamp - (self.t0 + self.next_slot / self.fps))
+        self.duplicated += repeat + emit_count - 1
+        self.emitted += repeat + emit_count
+        self.next_slot = slot + 1
+        return repeat, emit_count
+
+    def finish(self, stop_time):
+        """Returns how many times to repeat the last frame so the video reaches stop_time."""
+        if self.t0 is None or self.emitted == 0:
+            return 0
+        target = math.floor((stop_time - self.t0) * self.fps)
+        tail = max(0, target - self.next_slot)
+        self.duplicated += tail
+        self.emitted += tail
+        self.next_slot += tail
+        return tail
+
+    def report(self, stop_time=None, grabbed=None):
+        """
+        Summary of how far capture deviated from the nominal frame rate.
+        grabbed: total screen grabs, if some never reached the pacer (e.g. skipped static frames).
+        """
+        video_seconds = self.emitted / self.fps
+        result = {
+            "fps": self.fps,
+            "captured": self.captured,
+            "emitted": self.emitted,
+            "duplicated": self.duplicated,
+            "dropped": self.dropped,
+            "video_seconds": round(video_seconds, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+        if self.first_stamp is not None:
+            # First encoded capture against t0; the slots before it repeat that frame
+            result["head_gap_ms"] = round((self.first_stamp - self.t0) * 1000, 1)
+        if stop_time is not None and self.t0 is not None:
+            duration = stop_time - self.t0
+            grabs = self.captured if grabbed is None else grabbed
+            result["capture_fps"] = round(grabs / duration, 2) if duration > 0 else 0.0
+            # Under one frame interval is expected: the last frame covers a whole slot
+            result["drift_ms"] = round((video_seconds - duration) * 1000, 1)
+        return result
+
+
+class AudioAligner:
+    """
+    Puts one audio device's blocks on the recording timeline, which starts at the
+    first video frame (t0), so audio and video can simply be muxed from zero.
+
+    A block's first sample was captured at its arrival time minus its duration.
+    The first block is padded with silence (audio started after the first frame)
+    or trimmed (audio started before it). Later blocks are only measured: lag is
+    how far a block's arrival is behind where the written samples say it ends,
+    which grows if the device clock runs slow against the monotonic clock.
+    """
+
+    def __init__(self, samplerate, t0):
+        self.samplerate = samplerate
+        self.t0 = t0
+        self.start_offset = None # First sample time - t0, seconds
+        self.padded = 0
+        self.trimmed = 0
+        self.written = 0 # Frames on the timeline so far
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._to_trim = 0
+
+    def align(self, block, arrived, stop_time=None):
+        """
+        Returns the part of block (float32 frames x channels) that goes on the timeline.
+        stop_time: STOP time, once known; samples after it are cut so audio ends with the video.
+        """
+        fs = self.samplerate
+        if self.start_offset is None:
+            self.start_offset = arrived - len(block) / fs - self.t0
+            lead = int(round(self.start_offset * fs))
+            if lead > 0:
+                block = np.concatenate([np.zeros((lead, block.shape[1]), dtype=block.dtype), block])
+                self.padded = lead
+            else:
+                self._to_trim = -lead
+            logging.info(f"Audio starts {self.start_offset * 1000:+.1f} ms from the first frame; "
+                         f"{'padded' if lead > 0 else 'trimmed'} {abs(lead) / fs * 1000:.1f} ms")
+        if self._to_trim:
+            cut = min(self._to_trim, len(block))
+            block = block[cut:]
+            self._to_trim -= cut
+            self.trimmed += cut
+
+        end = self.written + len(block)
+        if len(block):
+            self.lag = arrived - (self.t0 + end / fs)
+            self.max_lag = max(self.max_lag, abs(self.lag))
+        if stop_time is not None:
+            block = block[:max(0, int(round((stop_time - self.t0) * fs)) - self.written)]
+        self.written += len(block)
+        return block
+
+    def report(self):
+        return {
+            "offset_ms": round(self.start_offset * 1000, 1) if self.start_offset is not None else None,
+            "padded_ms": round(self.padded / self.samplerate * 1000, 1),
+            "trimmed_ms": round(self.trimmed / self.samplerate * 1000, 1),
+            "drift_ms": round(self.lag * 1000, 1), # Lag of the last block
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
@@ -1,221 +1,1373 @@
 
-import cv2
-import mss
-import numpy as np
-import soundcard as sc
-from scipy.io.wavfile import write
 import threading
 import time
 import os
 import logging
-import pythoncom
+import multiprocessing as mp
+import shutil
+import tempfile
+
+try:
+    import pythoncom
+except ImportError: # Not on Windows
+    pythoncom = None
 
 import subprocess
 import logging
+import itertools
 # MoviePy removed in favor of direct ffmpeg
 
+from frame_queue import FrameRing, DROP_OLDEST
+from audio_writer import WavStreamWriter, AudioTee, dbfs
+from encoders import OpenCVEncoder, FFmpegEncoder, ffmpeg_available, concat_segments, trim_output, write_concat_list
+from pacing import AudioAligner, CaptureClock, FramePacer, now
+from frame_ops import ChangeDetector, PreviewTap, bgra_view, scaled_size
+from metrics import RecordingMetrics
+from mp_encoder import SharedFrameRing, encode_worker
+from replay import ReplayBuffer, ReplayEncoder
+from spool import FrameSpool, split_ranges
+from audio_mixer import DeviceStream, AudioMixer, SilenceWatch
+from audio_ring import AudioRing, DiscontinuityWatch, device_buffer
+from finalizer import FinalizeJob, FinalizeQueue, partial_path, place_file
+from devices import AudioDeviceCache
+from backends import MssBackend, audio_backend, desktop_backends, frame_backend, probe_frame_backends
+from capture_context import CaptureWorker
+from adaptive import AdaptiveController
+
+_session_ids = itertools.count(1)
+
+
+def bounding_box(rects):
+    """Smallest mss monitor dict covering every rect."""
+    left = min(r["left"] for r in rects)
+    top = min(r["top"] for r in rects)
+    right = max(r["left"] + r["width"] for r in rects)
+    bottom = max(r["top"] + r["height"] for r in rects)
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+
+class VideoOutput:
+    """
+    One video file of a recording: a rectangle of the grabbed area with its own
+    frame ring, pacer and encoder. Multi-region recordings have one per region,
+    all fed from the same grab.
+    """
+
+    def __init__(self, index, rect, origin, filename):
+        self.index = index
+        self.name = f"output {index + 1}"
+        self.rect = rect # Absolute screen rectangle (mss monitor dict)
+        self.width = rect["width"]
+        self.height = rect["height"]
+        # Position inside the grabbed bounding box
+        self.x = rect["left"] - origin["left"]
+        self.y = rect["top"] - origin["top"]
+        self.filename = filename
+        self.frame_size = None # (w, h) actually encoded
+        self.temp_video = None
+        self.segments_dir = None
+        self.frame_ring = None
+        self.pacer = None
+        self.encoder = None
+        self.encoder_thread = None
+        self.encoder_process = None
+        self.result_queue = None
+        self.deduplicated_frames = 0
+
+        # Filled in by finalization
+        self.encoder_result = None
+        self.pacing_report = None
+        self.dropped_frames = 0
+        self.output_bytes = None
+        self.spool_report = None
+
+    def start_timeline(self, t0):
+        """
+        Puts frame slot 0 at t0, the recording's first grab (the origin audio is aligned to),
+        rather than at the first frame the encoder gets: head frames dropped while the
+        encoder starts up then become repeats instead of shifting the video late.
+        """
+        if self.pacer:
+            self.pacer.t0 = t0
+        else:
+            self.frame_ring.t0.value = t0 # Pacing runs in the encoder process
+
+    def view(self, frame):
+        """This output's part of the grabbed frame, as a view (no copy)."""
+        return frame[self.y:self.y + self.height, self.x:self.x + self.width]
+
+    def scaled_size(self):
+        """Output (w, h) when this output is downscaled, else None."""
+        if self.frame_size and self.frame_size != (self.width, self.height):
+            return self.frame_size
+        return None
+
+    def single_pass(self):
+        """True when the encoder takes audio directly and no merge step is needed."""
+        return self.encoder is not None and self.encoder.has_audio
+
+    def spooled(self):
+        """True when frames go to a spool file and are encoded after stop."""
+        return isinstance(self.frame_ring, FrameSpool)
+
+
+def _level_summary(levels, samplerate):
+    """Whole-recording levels of one audio track (a PcmConverter), with where its sound starts and ends."""
+    return {
+        "peak_dbfs": round(dbfs(levels.peak), 1),
+        "rms_dbfs": round(dbfs(levels.rms), 1),
+        "seconds": round(levels.frames / samplerate, 3),
+        "first_sound_s": round(levels.first_sound / samplerate, 3) if levels.first_sound is not None else None,
+        "last_sound_s": round(levels.last_sound / samplerate, 3) if levels.last_sound is not None else None,
+    }
+
+
+class RecordingSession:
+    """
+    The objects of one recording, detached from the recorder at stop so that its
+    finalization can run in the background while the next recording starts.
+    """
+
+    def __init__(self, rec, stop_started):
+        self.id = rec.session_id
+        self.is_replay = rec.is_replay
+        self.stop_time = rec.stop_time
+        self.stop_started = stop_started
+        self.outputs = rec.outputs
+        self.metrics = rec.metrics
+        self.audio_stats = rec.audio_stats
+        self.adaptive = rec.controller.report() if rec.controller else None
+        self.capture_backend = rec.capture_source
+        self.audio_warning = rec.audio_warning
+        self.av_sync = rec.av_sync
+        self.audio_levels = [_level_summary(levels, rec.samplerate) for levels in rec.audio_levels]
+        # Spooled outputs are encoded at finalize with the settings of their recording
+        self.encode_settings = {"backend": rec._resolve_backend(), "preset": rec.encoder_preset,
+                                "crf": rec.crf, "jobs": rec.spool_encode_jobs}
+        # Temp files of this recording only, so sessions never clobber each other
+        self.workspace = rec.session_dir
+        self.audio_paths = [rec._audio_path(t) for t in range(rec._audio_track_count())]
+
+        # Filled in by finalization
+        self.capture_stop_seconds = time.perf_counter() - stop_started
+        self.stop_seconds = 0.0
+        self.ok = False
+
+    @property
+    def output_filenames(self):
+        return [out.filename for out in self.outputs]
+
 
 class ScreenRecorder:
     def __init__(self):
         self.is_recording = False
         self.output_filename = "output.mp4"
-        self.monitor = None
-        self.video_thread = None
+        self.monitor = None # Area grabbed each tick: the bounding box of all regions
+        self.monitor_index = 1 # Screen recorded when no region is given (sct.monitors[n], 0 = all)
+        self.outputs = [] # One VideoOutput per recorded region
+        self.video_done = None # Set when the capture loop on the capture thread has exited
         self.audio_thread = None
+
+        # Video pipeline settings
+        self.fps = 20.0
+        self.queue_depth = 8 # Frames buffered between capture and encoder
+        self.drop_policy = DROP_OLDEST # or BLOCK
+        self.skip_static_frames = True # Don't queue/convert frames identical to the previous one
+        self.static_row_step = 1 # Rows sampled by the change detector (1 = all; larger misses thin changes)
+        self.start_time = None
+        self.video_t0 = None # Clock time of the first frame: the timeline audio is aligned to
+        self.av_sync = None # Audio start offset / drift against video of the current recording
+        self._video_started = threading.Event()
+        self.stop_time = None
+
+        # Encoder settings
+        self.encoder_backend = "auto" # "ffmpeg" (single pass), "opencv" (mp4v + merge) or "auto"
+        self.x264_preset = "veryfast"
+        self.crf = 23
+        # Adaptive mode: under load the capture fps drops towards min_fps (the output stays
+        # at fps, with repeated frames) and later recordings use faster presets down to
+        # min_preset; with headroom both go back up. Bounds: [min_fps, fps], [min_preset, x264_preset].
+        self.adaptive = False
+        self.min_fps = 5.0
+        self.min_preset = "ultrafast"
+        self.adaptive_idle_seconds = 2.0 # Static screen is sampled at min_fps after this long (None = never)
+        self.adapted_preset = None # Where the controller left the preset; used by the next recording
+        self.controller = None
+        self.encoder_preset = self.x264_preset # Preset of the current recording
+        # Output resolution: fit inside output_size (w, h), e.g. (1920, 1080) for a 4K screen,
+        # or multiply by output_scale. Capture stays native; the encoder downscales.
+        self.output_size = None
+        self.output_scale = 1.0
+        # Encode in a separate process fed through shared memory (for 4K at high fps).
+        # Audio then goes to a temp WAV and is muxed after stop.
+        self.multiprocess_encoding = False
+        # Segmented mode (ffmpeg single-pass only): closed segments of this many seconds are
+        # written as the recording runs, so a crash loses at most one segment and stop
+        # only finalizes the last one and stream-copies the list. 0 = one file.
+        self.segment_seconds = 0
+        self.segments_dir = None # One subdirectory per recording; None = in the session workspace
+        # Spool mode ("capture now, encode later", for short high-fps bursts): the capture
+        # loop only copies frames into a preallocated memory-mapped file in spool_dir, and
+        # the video is encoded from it after stop, split over spool_encode_jobs parallel
+        # ffmpeg processes. Audio goes to a temp WAV. Takes precedence over multiprocess
+        # encoding, segments and adaptive mode.
+        self.spool_capture = False
+        self.spool_dir = None # Fast local disk; None = the session workspace
+        self.spool_max_mb = 4096 # Per output; frames past it are dropped (at 1080p: ~500 frames)
+        self.spool_encode_jobs = 1
+
+        # Instant replay: keep the last replay_seconds in memory instead of writing a file
+        self.is_replay = False
+        self.replay_seconds = 30
+        self.replay_max_mb = 256 # Cap for JPEG frames + PCM held in memory
+        self.replay_jpeg_quality = 80
+        self.replay_buffer = None
+        
+        # Live preview: while set, the capture loop keeps a small copy of a grabbed
+        # frame every few hundred ms in this PreviewTap (see ui_components.PreviewWindow)
+        self.preview_tap = None
         
         # Audio settings
         self.samplerate = 44100
         self.channels = 2 # Stereo
-        self.audio_data = [] # List to hold audio chunks
+        self.audio_block_seconds = 0.05 # Device read size: STOP is seen within one block
+        self.audio_ring_seconds = 5.0 # Capture -> writer ring; only full if the writer stalls this long
+
+        # Capture sources (see backends.py). "auto" times the installed desktop backends
+        # (mss, pil) on the recorded region at warm-up and keeps the fastest; or one of
+        # mss, pil, synthetic[:1080p], file:PATH, or a FrameBackend
+        self.capture_backend = "auto"
+        self.capture_probe = None # Probe results of "auto"
+        self.capture_source = None # Name of the backend in use
+        self.screen_factory = None # Explicit mss-like context factory; overrides capture_backend
+        self.audio_device = None # soundcard-like microphone; None = find the loopback
+        # Warm capture thread and cached device list (see warm_up)
+        self.devices = AudioDeviceCache()
+        self._capture = None
+        self._capture_lock = threading.Lock()
+        self._frame_backend = None
+        self._frame_backend_spec = None
+
+        # Multi-device audio: capture several devices at once, aligned and drift-compensated
+        self.audio_devices = None # Explicit list of soundcard-like devices; None = loopback (+ mic)
+        self.include_microphone = False # Also capture the default microphone
+        self.separate_audio_tracks = False # One audio track per device instead of one mix
+        self.audio_stats = None # Per-device alignment/drift stats of the last multi-device recording
 
-    def start_recording(self, filename, region=None):
+        # Audio levels: live meter (see live_metrics), silent-device warning and silence trim
+        self.silence_warn_seconds = 3.0 # Warn if the loopback is silent this long while another one plays (None = off)
+        self.trim_silence = False # Cut leading/trailing silence from the output at finalize
+        self.audio_levels = [] # PcmConverter of each audio track of the current recording
+        self.audio_warning = None
+
+        # Every recording gets its own temp workspace (silent video, WAVs, segments, spool)
+        # under temp_dir, e.g. a RAM disk or SSD; None = the system temp dir. Final files are
+        # written straight to their destination when it is known (see finalizer.py).
+        self.temp_dir = None
+        self.session_dir = None
+
+        # Stats of the current recording; finished ones live on their RecordingSession
+        self.metrics = RecordingMetrics()
+        self.session_id = None
+        self.last_session = None
+
+        # Stopped recordings are finalized (encoder drain, mux, cleanup) in the background
+        self.finalizer = FinalizeQueue()
+
+    def start_recording(self, filename, region=None, replay=False, regions=None):
         """
         Starts recording.
-        region: tuple (x, y, w, h) or None for full screen.
+        region: tuple (x, y, w, h), a monitor index (sct.monitors[n]) or None for monitor_index.
+        regions: several of those recorded at once, one file each (filename, then name_2.mp4,
+                 name_3.mp4, ...). One grab of their bounding box per tick feeds all of them,
+                 and they share one audio capture.
+        replay: capture into the in-memory replay buffer instead of a file (see start_replay).
         """
-        self.output_filename = filename
+        specs = list(regions) if regions else [region]
+        if replay and len(specs) > 1:
+            raise ValueError("Instant replay records a single region.")
+        self.start_time = now()
+        capture = self._capture_worker(specs)
+        self.capture_source = getattr(capture.screen_factory, "name", None) or "custom"
+        monitors = capture.call(lambda sct: list(sct.monitors))
+        rects = [self._region_rect(spec, monitors) for spec in specs]
+
+        self.session_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{next(_session_ids)}"
+        self.session_dir = os.path.join(self.temp_dir or tempfile.gettempdir(), f"antigravity_{self.session_id}")
+        os.makedirs(self.session_dir)
+        # No filename: write to a per-recording temp file the caller moves once finalized
+        self.output_filename = filename or self._temp_path("recording.mp4")
+        self.is_replay = replay
         self.is_recording = True
-        self.audio_data = [] # Reset
-        
-        # Setup Monitor
-        with mss.mss() as sct:
-            if region:
-                self.monitor = {"top": int(region[1]), "left": int(region[0]), "width": int(region[2]), "height": int(region[3])}
+        self.stop_time = None
+        self.metrics = RecordingMetrics()
+        self.audio_stats = None
+        self.audio_levels = []
+        self.audio_warning = None
+        self.video_t0 = None
+        self.av_sync = None
+        self._video_started = threading.Event()
+        self.controller = None
+        self.encoder_preset = self.x264_preset
+        spool = self.spool_capture and not replay
+        if self.adaptive and not replay and not spool:
+            self.controller = AdaptiveController(self.fps, self.min_fps, preset=self.adapted_preset or self.x264_preset,
+                                                 min_preset=self.min_preset, max_preset=self.x264_preset,
+                                                 idle_seconds=self.adaptive_idle_seconds)
+            self.encoder_preset = self.controller.preset
+            logging.info(f"Adaptive capture: {self.controller.min_fps:g}-{self.fps:g} fps, preset {self.encoder_preset}")
+
+        # Setup Monitor: one grab covers every region, each output slices its part
+        self.monitor = bounding_box(rects)
+        self.outputs = [VideoOutput(i, rect, self.monitor, self._output_path(i)) for i, rect in enumerate(rects)]
+
+        # Frame buffers are allocated once per recording, before capture starts
+        multiprocess = self.multiprocess_encoding and not replay and not spool
+        for out in self.outputs:
+            out.frame_size = scaled_size(out.width, out.height, self.output_scale, self.output_size)
+            if out.scaled_size():
+                logging.info(f"{out.name} scaled to {out.frame_size[0]}x{out.frame_size[1]}")
+            out.temp_video = self._temp_path("video_silent.mp4" if out.index == 0
+                                             else f"video_silent_{out.index + 1}.mp4")
+            out.segments_dir = self._segments_path(out.index)
+            if spool:
+                # Nothing is encoded live; the pacer runs over the spooled timestamps after stop
+                out.pacer = FramePacer(self.fps)
+                out.frame_ring = self._create_spool(out)
+            elif multiprocess:
+                # Pacing runs in the encoder process
+                out.frame_ring = SharedFrameRing(out.width, out.height, depth=self.queue_depth,
+                                                 policy=self.drop_policy)
             else:
-                self.monitor = sct.monitors[1] # Primary monitor
+                out.pacer = FramePacer(self.fps)
+                out.frame_ring = FrameRing(out.width, out.height, depth=self.queue_depth,
+                                           policy=self.drop_policy)
+
+        # Capture starts first on the warm capture thread; the rings hold the first
+        # frames while the encoders (ffmpeg / worker processes) are still starting up
+        self.video_done = capture.submit(self._record_video)
+        try:
+            for out in self.outputs:
+                if spool:
+                    continue
+                if multiprocess:
+                    self._start_encoder_process(out)
+                else:
+                    out.encoder = self._create_encoder(out)
+                    out.encoder_thread = threading.Thread(target=self._encode_video, args=(out,))
+        except Exception:
+            self.is_recording = False
+            for out in self.outputs:
+                out.frame_ring.close()
+            self.video_done.wait(timeout=2.0)
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+            raise
 
         # Start threads
-        self.video_thread = threading.Thread(target=self._record_video)
         self.audio_thread = threading.Thread(target=self._record_audio)
         
-        self.video_thread.start()
+        for out in self.outputs:
+            if out.encoder_thread:
+                out.encoder_thread.start()
         self.audio_thread.start()
-        logging.info(f"Recording started. Region: {self.monitor}")
+        if len(self.outputs) > 1:
+            logging.info(f"Recording started. Regions: {rects} (grabbing {self.monitor})")
+        else:
+            logging.info(f"Recording started. Region: {self.monitor}")
+
+    def _region_rect(self, spec, monitors):
+        """mss monitor dict for a region tuple (x, y, w, h) or a monitor index (None = monitor_index)."""
+        if spec is None:
+            spec = self.monitor_index
+        if isinstance(spec, int):
+            if not 0 <= spec < len(monitors):
+                raise ValueError(f"No monitor {spec}; this system has {len(monitors) - 1}.")
+            m = monitors[spec]
+            return {"left": int(m["left"]), "top": int(m["top"]), "width": int(m["width"]), "height": int(m["height"])}
+        return {"left": int(spec[0]), "top": int(spec[1]), "width": int(spec[2]), "height": int(spec[3])}
+
+    def _output_path(self, index):
+        """File of the index-th region: the output file itself, then name_2.mp4, name_3.mp4, ..."""
+        if index == 0:
+            return self.output_filename
+        root, ext = os.path.splitext(self.output_filename)
+        return f"{root}_{index + 1}{ext}"
+
+    def warm_up(self):
+        """
+        Call once at startup, off the UI thread: opens the capture context on its
+        thread and starts the background device enumeration, so START doesn't wait for either.
+        """
+        self.devices.start()
+        self._capture_worker()
+
+    def start_preview(self, max_size=(320, 240), interval=0.25):
+        """Starts the live preview tap (also mid-recording). Returns the PreviewTap to poll."""
+        if self.preview_tap is None:
+            self.preview_tap = PreviewTap(max_size, interval)
+        return self.preview_tap
+
+    def stop_preview(self):
+        self.preview_tap = None
+
+    @property
+    def audio_backend(self):
+        """Where audio devices come from (see backends.py): soundcard, synthetic, wav:PATH or an AudioBackend."""
+        return self.devices.backend.name if self.devices.backend else "soundcard"
+
+    @audio_backend.setter
+    def audio_backend(self, spec):
+        self.devices.backend = audio_backend(spec)
+        self.devices.invalidate()
+
+    def _capture_worker(self, specs=None):
+        """The warm capture thread for the current capture source (replaced if the source changed)."""
+        with self._capture_lock:
+            factory = self.screen_factory or self._select_frame_backend(specs)
+            if self._capture is None or self._capture.screen_factory is not factory:
+                if self._capture is not None:
+                    self._capture.close()
+                self._capture = CaptureWorker(factory)
+            return self._capture
+
+    def _select_frame_backend(self, specs):
+        """
+        FrameBackend for capture_backend. "auto" probes once (at warm-up, on the monitor
+        to record, or at the first START on its regions) and keeps the pick: the ranking
+        doesn't depend much on the region, and re-probing would delay START.
+        """
+        if self._frame_backend is not None and self._frame_backend_spec == self.capture_backend:
+            return self._frame_backend
+        if self.capture_backend != "auto":
+            backend = frame_backend(self.capture_backend)
+        else:
+            candidates = desktop_backends()
+            backend = candidates[0] if candidates else MssBackend() # Nothing installed: fail on open
+            if len(candidates) > 1:
+                def region(monitors):
+                    return bounding_box([self._region_rect(spec, monitors) for spec in specs or [None]])
+                fastest, self.capture_probe = probe_frame_backends(candidates, region)
+                backend = fastest or backend
+                logging.info(f"Capture backend probe: {self.capture_probe}")
+            logging.info(f"Capture backend: {backend.name}")
+        self._frame_backend = backend
+        self._frame_backend_spec = self.capture_backend
+        return backend
 
     def stop_recording(self):
-        """Stops recording and merges files."""
+        """Stops recording and finalizes it before returning. Returns the finished FinalizeJob."""
+        job = self.stop_capture()
+        if job:
+            job.run()
+        return job
+
+    def stop_recording_async(self, on_progress=None, on_done=None):
+        """
+        Stops recording and queues its finalization on the background finalizer.
+        Returns the FinalizeJob at once; a new recording can be started right away.
+        """
+        job = self.stop_capture(on_progress, on_done)
+        if job:
+            self.finalizer.submit(job)
+        return job
+
+    def stop_capture(self, on_progress=None, on_done=None):
+        """
+        Stops the capture threads (bounded by one frame / one audio block) and detaches
+        the recording into a FinalizeJob that drains the encoder and writes the output.
+        """
         if not self.is_recording:
-            return
+            return None
 
+        stop_started = time.perf_counter()
+        # Stop time is fixed before the threads see is_recording go False
+        self.stop_time = now()
+        for out in self.outputs:
+            if isinstance(out.frame_ring, SharedFrameRing):
+                out.frame_ring.stop_time.value = self.stop_time
+            elif out.frame_ring:
+                out.frame_ring.stop_time = self.stop_time
         self.is_recording = False
         
-        # Wait for threads with timeout to prevent hang
-        if self.video_thread:
-            self.video_thread.join(timeout=2.0)
+        # Wait for the capture threads with timeout to prevent hang.
+        # The encoders keep draining their rings; the job waits for them.
+        if self.video_done:
+            self.video_done.wait(timeout=2.0)
+        for out in self.outputs:
+            if out.frame_ring:
+                out.frame_ring.close()
         if self.audio_thread:
             self.audio_thread.join(timeout=2.0)
+
+        session = RecordingSession(self, stop_started)
+        self.last_session = session
+        self.outputs = [] # Owned by the session now
+        if self.controller:
+            self.adapted_preset = self.controller.preset
+        logging.info(f"Capture stopped in {session.capture_stop_seconds:.3f}s, finalizing {session.id}")
+        return FinalizeJob(session.id, lambda job: self._finalize(session, job),
+                           outputs=[] if session.is_replay else session.output_filenames,
+                           temp_files=[out.temp_video for out in session.outputs] + session.audio_paths
+                                      + [out.frame_ring.path for out in session.outputs if out.spooled()],
+                           temp_dirs=[session.workspace], session=session,
+                           on_progress=on_progress, on_done=on_done)
+
+    def _finalize(self, s, job):
+        """Drains the encoders of a stopped session and produces its output files. Runs as a FinalizeJob."""
+        count = len(s.outputs)
+        for i, out in enumerate(s.outputs):
+            ring = out.frame_ring
+            if out.encoder_thread:
+                # Encoder drains whatever is still queued before releasing the writer
+                while out.encoder_thread.is_alive():
+                    out.encoder_thread.join(timeout=0.25)
+                    job.update("encoding", 0.5 * (i + ring.frames_out / max(ring.frames_in, 1)) / count)
+            if out.encoder_process:
+                job.update("encoding", 0.5 * (i + 0.5) / count)
+                self._join_encoder_process(s, out)
+            if out.spooled():
+                self._encode_spool(s, out, job, i, count)
+
+            if ring:
+                out.dropped_frames = ring.dropped_frames
+                logging.info(f"{out.name}: frames captured: {ring.frames_in}, encoded: {ring.frames_out}, "
+                             f"dropped: {out.dropped_frames}")
+            if out.pacer:
+                grabbed = ring.frames_in + out.deduplicated_frames
+                out.pacing_report = out.pacer.report(s.stop_time, grabbed=grabbed)
+                out.pacing_report["static_skipped"] = out.deduplicated_frames
+                logging.info(f"{out.name}: frame pacing: {out.pacing_report}")
             
-        logging.info("Recording threads stopped. Merging files...")
-        self._merge_files()
-        logging.info("Merge complete.")
-
-    def _record_video(self):
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v") # Better compat than XVID for some players
-        fps = 20.0
-        # Wait for monitor to be set
-        timeout = 0
-        while not self.monitor and timeout < 20: 
-            time.sleep(0.1)
-            timeout += 1
-        
-        if not self.monitor:
-            logging.error("Monitor not set, stopping video thread.")
+        job.update("finishing encoder", 0.5)
+        ok = True
+        for out in s.outputs:
+            ok = self._finish_output(s, out, job) and ok
+        if not s.is_replay:
+            job.outputs = s.output_filenames # Where they were saved
+        s.stop_seconds = time.perf_counter() - s.stop_started
+        s.metrics.finish()
+        s.ok = ok
+        logging.info(f"Recording metrics: {s.metrics.summary()}")
+        return ok
+
+    def _finish_output(self, s, out, job):
+        """
+        Closes one output's encoder and writes its file (segment join or mux) under its
+        .partial name, then renames it into place. Returns True on success.
+        """
+        ok = out.encoder.close() if out.encoder else bool(out.encoder_result and out.encoder_result["ok"])
+        if s.is_replay:
+            logging.info("Replay capture stopped.")
+            return ok
+        # The save path, if the UI has one by now: the file is then written there directly
+        target = job.output_path(out.index, out.filename)
+        written = partial_path(target)
+        if out.single_pass() and out.encoder.segment_list:
+            job.update("joining segments", 0.75)
+            logging.info(f"Recording threads stopped. Joining segments from {out.segments_dir}...")
+            ok = self._join_segments(out, written) and ok
+        elif out.single_pass():
+            # Single pass: ffmpeg already wrote the file, next to out.filename
+            written = partial_path(out.filename)
+            logging.info(f"Recording threads stopped. Encoder {'finished' if ok else 'failed'}.")
+        else:
+            job.update("merging", 0.75)
+            logging.info("Recording threads stopped. Merging files...")
+            ok = self._merge_files(s, out, written)
+            logging.info("Merge complete.")
+        if ok and self.trim_silence:
+            job.update("trimming silence", 0.9)
+            self._trim_silence(s, written)
+        if os.path.exists(written):
+            place_file(written, target)
+            out.filename = target
+            out.output_bytes = os.path.getsize(target)
+        return ok
+
+    def _trim_silence(self, s, path, margin=0.25):
+        """Cuts the output to where its audio has sound (plus a margin). Keeps it unchanged on failure."""
+        levels = s.audio_levels
+        sounds = [l for l in levels if l["first_sound_s"] is not None]
+        if not sounds:
+            logging.info("Not trimming: the recording has no sound at all.")
             return
-            
-        width = self.monitor["width"]
-        height = self.monitor["height"]
-        
+        duration = max(l["seconds"] for l in levels)
+        start = max(0.0, min(l["first_sound_s"] for l in sounds) - margin)
+        end = min(duration, max(l["last_sound_s"] for l in sounds) + margin)
+        if start < 0.5 and duration - end < 0.5:
+            return # Nothing worth cutting
+        logging.info(f"Trimming silence of {path}: keeping {start:.2f}s - {end:.2f}s of {duration:.2f}s")
+        trim_output(path, start, end)
+
+    def start_replay(self, region=None):
+        """
+        Starts instant-replay capture: the last replay_seconds of screen and audio are kept
+        in a memory-capped buffer until stop_replay(). Use save_replay() to dump them.
+        """
+        self.replay_buffer = ReplayBuffer(self.fps, self.samplerate, 2,
+                                          max_seconds=self.replay_seconds,
+                                          max_bytes=self.replay_max_mb * 1024 * 1024)
+        self.start_recording(None, region, replay=True)
+
+    def save_replay(self, path, seconds=None, on_done=None):
+        """
+        Dumps the last `seconds` (default: whole buffer) to an MP4 in a background thread.
+        Capture keeps running. on_done(ok, path) is called from that thread when finished.
+        """
+        buffer = self.replay_buffer
+        if buffer is None:
+            raise RuntimeError("Replay is not running.")
+
+        def run():
+            ok = buffer.save(path, seconds)
+            if on_done:
+                on_done(ok, path)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop_replay(self):
+        self.stop_recording()
+        self.is_replay = False
+        self.replay_buffer = None
+
+    def get_stats(self, session=None):
+        """Counters of the last (or given) finished recording, for benchmarks and diagnostics."""
+        s = session or self.last_session
+        if s is None:
+            return {}
+        rings = [out.frame_ring for out in s.outputs if out.frame_ring]
+        encoded = [self._encoded_frames(out) for out in s.outputs]
+        total = sum(encoded)
+        # write/repeat time is summed over all encoders
+        encode_seconds = s.metrics.total("write") + s.metrics.total("repeat")
+        stats = {
+            "captured": sum(r.frames_in for r in rings),
+            "static_skipped": sum(out.deduplicated_frames for out in s.outputs),
+            "dropped": sum(r.dropped_frames for r in rings),
+            "encoded": total,
+            "encode_fps": round(total / encode_seconds, 2) if encode_seconds else 0.0,
+            "capture_stop_seconds": round(s.capture_stop_seconds, 3),
+            "stop_seconds": round(s.stop_seconds, 3),
+        }
+        primary = s.outputs[0]
+        if primary.pacing_report:
+            stats["pacing"] = primary.pacing_report
+        if primary.spool_report:
+            stats["spool"] = primary.spool_report
+        if s.audio_stats:
+            stats["audio_devices"] = s.audio_stats
+        if s.capture_backend:
+            stats["capture_backend"] = s.capture_backend
+        if s.av_sync:
+            stats["av_sync"] = s.av_sync
+        if s.adaptive:
+            stats["adaptive"] = s.adaptive
+        if s.audio_levels:
+            stats["audio_levels"] = s.audio_levels
+        if s.audio_warning:
+            stats["audio_warning"] = s.audio_warning
+        if len(s.outputs) == 1:
+            stats.update(self._scaling_stats(primary, total, encode_seconds))
+        else:
+            stats["outputs"] = [dict({
+                "file": out.filename,
+                "captured": out.frame_ring.frames_in if out.frame_ring else 0,
+                "dropped": out.dropped_frames,
+                "encoded": frames,
+                "pacing": out.pacing_report,
+            }, **self._scaling_stats(out, frames)) for out, frames in zip(s.outputs, encoded)]
+        return stats
+
+    @staticmethod
+    def _encoded_frames(out):
+        if out.encoder:
+            return out.encoder.frames
+        return out.encoder_result.get("frames", 0) if out.encoder_result else 0
+
+    @staticmethod
+    def _scaling_stats(out, encoded, encode_seconds=None):
+        """
+        Output resolution and its effect. Only measured figures: x264 time and bitrate grow
+        well below linearly with pixel count, so what native size would have cost can't be
+        derived from pixel_ratio; run the benchmark with and without --output-size for that.
+        encode_seconds is only known for single-output recordings (encoders share the metrics).
+        """
+        (cw, ch), (ow, oh) = (out.width, out.height), out.frame_size
+        stats = {
+            "capture_size": f"{cw}x{ch}",
+            "output_size": f"{ow}x{oh}",
+            "output_mb": round(out.output_bytes / 1e6, 2) if out.output_bytes is not None else None,
+        }
+        if encode_seconds is not None:
+            stats["encode_ms_per_frame"] = round(encode_seconds / encoded * 1000, 2) if encoded else None
+        ratio = (cw * ch) / (ow * oh)
+        if ratio > 1.0:
+            stats["pixel_ratio"] = round(ratio, 2)
+        return stats
+
+    def live_metrics(self):
+        """Compact snapshot for the UI while recording."""
+        live = self.metrics.live()
+        rates = live["rates"]
+        rings = [out.frame_ring for out in self.outputs if out.frame_ring]
+        ring = rings[0] if rings else None
+        levels = self.audio_levels
+        return {
+            # Per output: every region's encoder counts its frames
+            "fps": rates.get("frames_written", 0.0) / max(len(rings), 1),
+            "capture_fps": rates.get("frames_grabbed", 0.0),
+            "queue": ring.qsize() if ring else 0,
+            "queue_depth": ring.depth if ring else 0,
+            "dropped": sum(r.dropped_frames for r in rings),
+            "grab_ms": live["last_ms"].get("grab", 0.0),
+            "convert_ms": live["last_ms"].get("convert", 0.0),
+            "write_ms": live["last_ms"].get("write", 0.0),
+            "audio_ms": live["last_ms"].get("audio_block", 0.0),
+            "audio_overruns": live["counters"].get("audio_overruns", 0),
+            # Last audio block, loudest track
+            "audio_peak_db": dbfs(max(l.block_peak for l in levels)) if levels else -120.0,
+            "audio_rms_db": dbfs(max(l.block_rms for l in levels)) if levels else -120.0,
+            "audio_warning": self.audio_warning,
+        }
+
+    def write_metrics(self, path, session=None):
+        """Saves the metrics summary of the last (or given) recording as JSON."""
+        s = session or self.last_session
+        if s is not None:
+            s.metrics.write_json(path, extra=self.get_stats(s))
+
+    def _single_pass(self):
+        """True when the encoders take audio directly and no merge step is needed."""
+        return bool(self.outputs) and self.outputs[0].single_pass()
+
+    def _resolve_backend(self):
+        if self.encoder_backend == "auto":
+            return "ffmpeg" if ffmpeg_available() else "opencv"
+        return self.encoder_backend
+
+    def _start_encoder_process(self, out):
+        ctx = mp.get_context("spawn")
+        log_file = next((h.baseFilename for h in logging.getLogger().handlers if hasattr(h, "baseFilename")), None)
+        config = {
+            "backend": self._resolve_backend(),
+            "path": out.temp_video, # Video only, merged with the WAV after stop
+            "width": out.width,
+            "height": out.height,
+            "fps": self.fps,
+            "preset": self.encoder_preset,
+            "crf": self.crf,
+            "output_size": out.scaled_size(),
+            "log_file": log_file,
+        }
+        out.result_queue = ctx.Queue()
+        out.encoder_process = ctx.Process(target=encode_worker, name="encoder",
+                                          args=(out.frame_ring.worker_args(), config, out.result_queue),
+                                          daemon=True)
+        out.encoder_process.start()
+        logging.info(f"Encoder process for {out.name} started (pid {out.encoder_process.pid}).")
+
+    def _join_encoder_process(self, s, out):
+        """Waits for an output's encoder process to drain its shared ring and collects its report."""
+        try:
+            out.encoder_result = out.result_queue.get(timeout=60)
+        except Exception as e:
+            logging.error(f"No result from encoder process: {e}")
+            out.encoder_result = {"ok": False}
+        out.encoder_process.join(timeout=5)
+        if out.encoder_process.is_alive():
+            out.encoder_process.terminate()
+        out.encoder_process = None
+        out.frame_ring.release_memory()
+
+        if "metrics" in out.encoder_result:
+            s.metrics.absorb(out.encoder_result["metrics"])
+        out.pacing_report = out.encoder_result.get("pacing")
+        if out.pacing_report:
+            out.pacing_report["static_skipped"] = out.deduplicated_frames
+            logging.info(f"{out.name}: frame pacing: {out.pacing_report}")
+
+    def _join_segments(self, out, output):
+        """Concatenates an output's finished segments into output. Returns True on success."""
+        list_path = out.encoder.segment_list
+        if not os.path.exists(list_path):
+            logging.error("No segments were written.")
+            return False
+        if concat_segments(list_path, output):
+            logging.info(f"Segments joined. Saved to {output}")
+            shutil.rmtree(out.segments_dir, ignore_errors=True)
+            return True
+        # Keep the segments so the recording can still be recovered by hand
+        logging.error(f"Segments kept in {out.segments_dir} (manifest: {list_path})")
+        return False
+
+    def _temp_path(self, name):
+        """Temp file of the current recording, in its own workspace so concurrent jobs never meet."""
+        return os.path.join(self.session_dir, name)
+
+    def _segments_path(self, index=0):
+        if self.segments_dir is None:
+            return self._temp_path("segments" if index == 0 else f"segments_{index + 1}")
+        name = self.session_id if index == 0 else f"{self.session_id}_{index + 1}"
+        return os.path.join(self.segments_dir, name)
+
+    def _create_spool(self, out):
+        """FrameSpool of one output in spool_dir, capped by spool_max_mb and its share of the free disk space."""
+        directory = self.spool_dir or self.session_dir
+        os.makedirs(directory, exist_ok=True)
+        name = f"{self.session_id}.spool" if out.index == 0 else f"{self.session_id}_{out.index + 1}.spool"
+        free = shutil.disk_usage(directory).free * 0.9 / len(self.outputs)
+        spool = FrameSpool(os.path.join(directory, f"antigravity_{name}"), out.width, out.height,
+                           min(self.spool_max_mb * 1024 * 1024, free))
+        logging.info(f"{out.name} spooled to {spool.path}: room for {spool.capacity} frames "
+                     f"({spool.capacity / self.fps:.1f}s at {self.fps:g} fps)")
+        return spool
+
+    def _encode_spool(self, s, out, job, index, count):
+        """
+        Encodes a spooled output into its silent temp video. With spool_encode_jobs > 1
+        (ffmpeg) the paced timeline is cut into frame ranges encoded in parallel and
+        joined by stream copy. Returns True on success.
+        """
+        spool = out.frame_ring
+        settings = s.encode_settings
+        order = spool.plan(out.pacer, s.stop_time)
+        if not order:
+            logging.error(f"{out.name}: no frames were spooled.")
+            spool.release()
+            out.encoder_result = {"ok": False, "frames": 0}
+            return False
+        backend = settings["backend"]
+        jobs = settings["jobs"] if backend == "ffmpeg" else 1
+        # At least a second per range: every range starts with a keyframe and an encoder start-up
+        ranges = split_ranges(len(order), jobs, min_size=out.pacer.fps)
+        root, ext = os.path.splitext(out.temp_video)
+        paths = [out.temp_video] if len(ranges) == 1 else [f"{root}.part{n + 1}{ext}" for n in range(len(ranges))]
+        written = [0] * len(ranges)
+        results = [False] * len(ranges)
+
+        def encode(n):
+            start, end = ranges[n]
+            try:
+                if backend == "ffmpeg":
+                    encoder = FFmpegEncoder(paths[n], out.width, out.height, out.pacer.fps, preset=settings["preset"],
+                                            crf=settings["crf"], output_size=out.scaled_size())
+                else:
+                    encoder = OpenCVEncoder(paths[n], out.width, out.height, out.pacer.fps, metrics=s.metrics,
+                                            output_size=out.scaled_size())
+                try:
+                    spool.encode(encoder, order, start, end, s.metrics, lambda done: written.__setitem__(n, done))
+                finally:
+                    results[n] = encoder.close()
+            except Exception as e:
+                logging.error(f"Error encoding {out.name} frames {start}-{end}: {e}")
+
+        started = now()
+        threads = [threading.Thread(target=encode, args=(n,), name=f"spool-encoder-{n + 1}") for n in range(len(ranges))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.25)
+                job.update("encoding", 0.5 * (index + sum(written) / len(order)) / count)
+        ok = all(results)
+        encode_seconds = now() - started
+        spool.release() # The encoders are gone, so no frame views are left
+
+        if len(ranges) > 1:
+            list_path = f"{root}.parts.ffconcat"
+            if ok:
+                write_concat_list(paths, list_path)
+                ok = concat_segments(list_path, out.temp_video)
+            for path in paths + [list_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+        out.encoder_result = {"ok": ok, "frames": sum(written)}
+        out.spool_report = {
+            "frames": spool.frames_in,
+            "capacity": spool.capacity,
+            "dropped": spool.dropped_frames,
+            "encode_jobs": len(ranges),
+            "encode_seconds": round(encode_seconds, 3),
+        }
+        logging.info(f"{out.name}: spool encoded: {out.spool_report}")
+        return ok
+
+    def _create_encoder(self, out):
+        width = out.width
+        height = out.height
+        backend = self._resolve_backend()
+
+        if self.is_replay:
+            self.channels = 2
+            return ReplayEncoder(self.replay_buffer, out.pacer, quality=self.replay_jpeg_quality,
+                                 output_size=out.scaled_size())
+
+        if self.segment_seconds and backend != "ffmpeg":
+            logging.warning("Segmented recording needs ffmpeg; recording a single file instead.")
+
+        if backend == "ffmpeg":
+            # Fixed stream layout: the audio thread adapts device channels to it
+            self.channels = 2
+            if self.segment_seconds:
+                shutil.rmtree(out.segments_dir, ignore_errors=True)
+                os.makedirs(out.segments_dir)
+                return FFmpegEncoder(out.segments_dir, width, height, self.fps,
+                                     preset=self.encoder_preset, crf=self.crf,
+                                     samplerate=self.samplerate, channels=self.channels,
+                                     segment_seconds=self.segment_seconds,
+                                     audio_tracks=self._audio_track_count(),
+                                     output_size=out.scaled_size())
+            # Renamed into place at finalize
+            return FFmpegEncoder(partial_path(out.filename), width, height, self.fps,
+                                 preset=self.encoder_preset, crf=self.crf,
+                                 samplerate=self.samplerate, channels=self.channels,
+                                 audio_tracks=self._audio_track_count(),
+                                 output_size=out.scaled_size())
         # Temp video file
-        temp_video = "temp_video_silent.mp4" # Changed to mp4 directly
-        out = cv2.VideoWriter(temp_video, fourcc, fps, (width, height))
+        return OpenCVEncoder(out.temp_video, width, height, self.fps, metrics=self.metrics,
+                             output_size=out.scaled_size())
+
+    def _audio_track_count(self):
+        """Number of audio tracks in the output (1 unless separate tracks are requested)."""
+        if not self.separate_audio_tracks or self.is_replay:
+            return 1
+        if self.audio_devices:
+            return max(1, len(self.audio_devices))
+        return 2 if self.include_microphone else 1
+
+    def _audio_path(self, track=0):
+        return self._temp_path("audio.wav" if track == 0 else f"audio_{track}.wav")
+
+    def _open_audio_sink(self, fs, channels, track=0):
+        """
+        Audio goes straight into the encoders when they have an audio input, else to a temp WAV.
+        Multi-region recordings share the capture: each block is sent to every encoder
+        (or the one WAV is muxed into every output).
+        """
+        if self._single_pass():
+            sinks = [out.encoder.open_audio(track=track) for out in self.outputs]
+            return sinks[0] if len(sinks) == 1 else AudioTee(sinks)
+        return WavStreamWriter(self._audio_path(track), fs, channels)
+
+    def _record_video(self, sct):
+        """Capture loop, run on the capture thread with its warm screen context: only grabs into the frame rings."""
+        outputs = self.outputs
+        metrics = self.metrics
+        controller = self.controller
+        rings = [out.frame_ring for out in outputs]
+        clock = CaptureClock(self.fps)
+        detectors = [ChangeDetector(self.static_row_step) if self.skip_static_frames else None for _ in outputs]
+        for out in outputs:
+            out.deduplicated_frames = 0
+        running = True
         
-        with mss.mss() as sct:
-            while self.is_recording:
-                last_time = time.time()
-                try:
-                    img = sct.grab(self.monitor)
-                    frame = np.array(img)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+        while self.is_recording and running:
+            try:
+                # Stamp with the monotonic clock the pacer and audio use
+                stamp = now()
+                img = sct.grab(self.monitor) # One grab covers every region
+                frame = bgra_view(img) # No copy; the ring slot copy is the only one
+                grabbed = now()
+                metrics.add_time("grab", grabbed - stamp)
+                if not metrics.get("frames_grabbed"):
+                    metrics.add_time("first_frame", grabbed - self.start_time) # START -> first frame
+                    # The pacers start their timelines at this stamp too (before any frame reaches them)
+                    self.video_t0 = stamp
+                    for out in outputs:
+                        out.start_timeline(stamp)
+                    self._video_started.set()
+                metrics.count("frames_grabbed")
+                tap = self.preview_tap
+                if tap:
+                    tap.offer(frame, stamp) # The whole grab: every region of this recording
+                queued = False
+                for out, detector in zip(outputs, detectors):
+                    view = out.view(frame) # Region slice of the same grab, still no copy
+                    started = now()
+                    if detector and not detector.changed(view):
+                        # Static region: its encoder repeats the previous frame for this slot
+                        out.deduplicated_frames += 1
+                        metrics.add_time("detect", now() - started)
+                    else:
+                        ok = out.frame_ring.put(view, stamp)
+                        metrics.add_time("queue", now() - started)
+                        queued = True
+                        if not ok:
+                            running = False
+                if controller:
+                    fps = controller.update(queued, rings, metrics, clock.skipped_ticks)
+                    if fps != clock.fps:
+                        clock.set_fps(fps)
+            except Exception as e:
+                logging.error(f"Error capturing screen: {e}")
+                break
+            
+            # FPS Control
+            clock.wait()
+
+        # Let the encoders drain and finish
+        for out in outputs:
+            out.frame_ring.close()
+        logging.info(f"Video capture finished. Missed capture ticks: {clock.skipped_ticks}, "
+                     f"static frames skipped: {sum(out.deduplicated_frames for out in outputs)}")
+
+    def _encode_video(self, output):
+        """
+        Encoder thread of one output: drains its frame ring and writes a constant frame rate stream.
+        The last written slot is held back (not released) so the pacer can repeat it.
+        """
+        ring = output.frame_ring
+        out = output.encoder
+        pacer = output.pacer
+        metrics = self.metrics
+        held = None # Slot index of the last written frame
+        
+        try:
+            while True:
+                item = ring.get(timeout=0.5)
+                if item is None:
+                    if ring.closed:
+                        break
+                    continue
+                index, frame, stamp = item
+                repeat, emit = pacer.place(stamp)
+                if not emit:
+                    ring.release(index)
+                    continue
+                repeat_start = now()
+                for _ in range(repeat):
+                    out.repeat()
+                with metrics.stage("write"):
                     out.write(frame)
-                except Exception as e:
-                    logging.error(f"Error capturing screen: {e}")
-                    break
-                
-                # FPS Control
-                delay = 1.0 / fps - (time.time() - last_time)
-                if delay > 0:
-                    time.sleep(delay)
-                    
-        out.release()
-        logging.info("Video recording finished.")
+                for _ in range(emit - 1):
+                    out.repeat()
+                if repeat or emit > 1:
+                    metrics.add_time("repeat", now() - repeat_start - metrics.stages["write"].last)
+                metrics.count("frames_written", repeat + emit)
+                if held is not None:
+                    ring.release(held)
+                held = index
+
+            # Hold the last frame until the moment STOP was pressed
+            if held is not None:
+                with metrics.stage("repeat"):
+                    for _ in range(pacer.finish(ring.stop_time or now())):
+                        out.repeat()
+        except Exception as e:
+            logging.error(f"Error encoding video: {e}")
+            # Unblock the capture thread if it is waiting for a free slot
+            ring.close()
+        finally:
+            if held is not None:
+                ring.release(held)
+        logging.info(f"Video recording of {output.name} finished.")
+
+    def _write_silent_audio(self, frames=44100):
+        for track in range(self._audio_track_count()):
+            with self._open_audio_sink(self.samplerate, self.channels, track) as sink:
+                sink.write_silence(frames)
+
+    def _find_loopback(self):
+        """Returns the loopback microphone of the default speaker (or the first loopback), or None."""
+        # Cached enumeration, refreshed in the background (see devices.py)
+        snapshot = self.devices.get()
+        if snapshot.default_speaker is None:
+            logging.error("No audio backend or default speaker available.")
+            return None
+
+        # Get default speaker
+        default_speaker = snapshot.default_speaker
+        logging.info(f"Default Speaker: {default_speaker.name} (ID: {default_speaker.id})")
+        
+        # Try to find matching loopback
+        loopbacks = snapshot.microphones
+        
+        # 1. Try to find loopback with same name/ID as speaker
+        for m in loopbacks:
+            if m.isloopback and (m.name == default_speaker.name or m.id == default_speaker.id):
+                logging.info(f"Found matching loopback: {m.name}")
+                return m
+        
+        # 2. If not found, look for any loopback (common fallback)
+        # Filter only loopbacks
+        loopback_mics = [m for m in loopbacks if m.isloopback]
+        if loopback_mics:
+            logging.info(f"Fallback: Using first available loopback: {loopback_mics[0].name}")
+            return loopback_mics[0]
+
+        logging.error("No loopback microphones found in system.")
+        # List all mics for debug
+        for i, m in enumerate(loopbacks):
+             logging.info(f"Device {i}: {m.name} (Loopback: {m.isloopback})")
+        return None
+
+    def _select_audio_devices(self):
+        """Devices to capture: the explicit list, else the loopback plus (optionally) the default mic."""
+        if self.audio_devices:
+            return list(self.audio_devices)
+        devices = []
+        loopback = self.audio_device or self._find_loopback()
+        if loopback is not None:
+            devices.append(loopback)
+        if self.include_microphone:
+            mic = self.devices.get().default_microphone
+            if mic is not None:
+                logging.info(f"Default Microphone: {mic.name}")
+                devices.append(mic)
+            else:
+                logging.error("No default microphone.")
+        return devices
+
+    def _silence_watch(self, recorded):
+        """SilenceWatch of the first recorded device (if it is a loopback) against the loopbacks not recorded."""
+        if self.silence_warn_seconds is None or not getattr(recorded[0], "isloopback", False):
+            return None
+        ids = {str(d.id) for d in recorded}
+        candidates = [m for m in self.devices.get().loopbacks if str(m.id) not in ids]
+        if not candidates:
+            return None
+
+        def on_warning(text):
+            self.audio_warning = text
+        return SilenceWatch(recorded[0].name, candidates, self.samplerate, self.silence_warn_seconds, on_warning)
+
+    def _timeline_origin(self, timeout=2.0):
+        """Clock time of the first video frame, the origin audio is aligned to (START if none came)."""
+        if not self._video_started.wait(timeout):
+            logging.warning("No video frame yet; aligning audio to START instead.")
+            return self.start_time
+        return self.video_t0
 
     def _record_audio(self):
         try:
-            # Clear previous data
-            self.audio_data = []
-
-            # Initialize COM for this thread
             # Initialize COM for this thread - Must be MTA for Media Foundation/SoundCard
-            pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+            if pythoncom:
+                pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
             
-            # soundcard setup
-            fs = self.samplerate = 44100
+            fs = self.samplerate
             
             try:
-                # Get default speaker
-                default_speaker = sc.default_speaker()
-                logging.info(f"Default Speaker: {default_speaker.name} (ID: {default_speaker.id})")
-                
-                # Try to find matching loopback
-                mic = None
-                loopbacks = sc.all_microphones(include_loopback=True)
-                
-                # 1. Try to find loopback with same name/ID as speaker
-                for m in loopbacks:
-                    if m.isloopback and (m.name == default_speaker.name or m.id == default_speaker.id):
-                        mic = m
-                        logging.info(f"Found matching loopback: {mic.name}")
-                        break
-                
-                # 2. If not found, look for any loopback (common fallback)
-                if not mic:
-                    # Filter only loopbacks
-                    loopback_mics = [m for m in loopbacks if m.isloopback]
-                    if loopback_mics:
-                        mic = loopback_mics[0]
-                        logging.info(f"Fallback: Using first available loopback: {mic.name}")
-                    else:
-                        logging.error("No loopback microphones found in system.")
-                        # List all mics for debug
-                        for i, m in enumerate(loopbacks):
-                             logging.info(f"Device {i}: {m.name} (Loopback: {m.isloopback})")
-                        # Write silent wav
-                        write("temp_audio.wav", 44100, np.zeros((44100, 2), dtype=np.int16))
-                        return
-
-                self.channels = mic.channels
+                devices = self._select_audio_devices()
+                if not devices:
+                    # Write silent audio
+                    self._write_silent_audio()
+                    return
+                mic = devices[0]
+
+                if not self._single_pass():
+                    self.channels = mic.channels
             except Exception as e:
                 logging.error(f"Error finding loopback device: {e}")
                 return
+            if len(devices) > 1:
+                # Its errors go to the handler below, not to the device lookup's
+                self._record_mixed(devices)
+                return
             
             logging.info(f"Audio Recording started on {mic.name}. Rate={fs}, Channels={self.channels}")
             
-            # Record in chunks
-            # Record in chunks - larger buffer (0.5s) to prevent discontinuity warnings and drops
-            block_size = int(fs * 0.5)
-            
-            with mic.recorder(samplerate=fs) as recorder:
-                while self.is_recording:
-                    # Record chunk
-                    data = recorder.record(numframes=block_size)
-                    self.audio_data.append(data)
-                    
-            # Save temp audio
-            if self.audio_data:
-                full_audio = np.concatenate(self.audio_data, axis=0)
-                
-                # Check for silence (debug)
-                max_vol = np.max(np.abs(full_audio))
-                mean_vol = np.mean(np.abs(full_audio))
-                logging.info(f"Audio recorded. Max amplitude: {max_vol:.4f}, Mean: {mean_vol:.4f}")
-                
-                if max_vol == 0:
-                    logging.warning("Recorded audio is completely silent (0.0). Check microphone volume.")
-                
-                # soundcard returns float32 -1.0 to 1.0, convert to int16 for WAV
-                full_audio_int16 = (full_audio * 32767).astype(np.int16)
-                write("temp_audio.wav", fs, full_audio_int16)
-                logging.info(f"Audio recording finished. Frames: {len(full_audio)}")
-            else:
-                logging.warning("No audio data recorded.")
-                # Create silent file
-                write("temp_audio.wav", fs, np.zeros((100, self.channels), dtype=np.int16))
+            # Small reads copied into a ring; the writer thread converts and writes them, so
+            # this loop is back in record() at once and sees STOP within one block
+            block_size = int(fs * self.audio_block_seconds)
+            metrics = self.metrics
+            ring = AudioRing(fs * self.audio_ring_seconds, mic.channels)
+            writer = threading.Thread(target=self._write_audio, args=(ring, mic), name="audio-writer")
+            seen = 0
+            try:
+                with DiscontinuityWatch() as gaps, mic.recorder(samplerate=fs, blocksize=device_buffer(fs)) as recorder:
+                    writer.start()
+                    last_block = None
+                    while self.is_recording and writer.is_alive():
+                        data = recorder.record(numframes=block_size)
+                        arrived = now()
+                        if last_block is not None:
+                            metrics.add_time("audio_block", arrived - last_block)
+                        last_block = arrived
+                        if not ring.put(data, arrived):
+                            metrics.count("audio_overruns")
+                        # soundcard warns when the device buffer overran between reads
+                        if gaps.count > seen:
+                            metrics.count("audio_discontinuities", gaps.count - seen)
+                            metrics.count("audio_overruns", gaps.count - seen)
+                            seen = gaps.count
+            finally:
+                # The writer flushes everything up to the last block before it exits
+                ring.close()
+                if writer.ident is not None: # Started
+                    writer.join()
+            if ring.dropped_frames:
+                metrics.count("audio_ring_dropped", ring.dropped_frames)
+                logging.warning(f"Audio writer fell behind: {ring.dropped_frames} frames dropped")
 
         except Exception as e:
             logging.error(f"Audio recording internal error: {e}")
+            self.devices.invalidate() # Device may have gone away; re-enumerate next time
             import traceback
             logging.error(traceback.format_exc())
-            write("temp_audio.wav", 44100, np.zeros((44100, 2), dtype=np.int16))
+            # Keep whatever was streamed to disk before the error
+            if not self._single_pass() and not os.path.exists(self._audio_path()):
+                self._write_silent_audio()
 
-    def _merge_files(self):
-        temp_video = "temp_video_silent.mp4"
-        audio_path = "temp_audio.wav"
+    def _write_audio(self, ring, mic):
+        """
+        Writer thread of the single-device path: drains the ring into the sink (WAV or
+        encoder), aligned to the first video frame, until the capture loop closed it.
+        """
+        fs = self.samplerate
+        metrics = self.metrics
+        try:
+            # Blocks are converted to int16 and appended to the WAV as they arrive,
+            # so memory use does not grow with the recording length
+            watch = self._silence_watch([mic])
+            with self._open_audio_sink(fs, self.channels) as wav:
+                self.audio_levels = [wav.converter]
+                aligner = None
+                while True:
+                    closed = ring.closed # Read first: everything put before the close gets drained
+                    data, arrived = ring.take()
+                    if data is None:
+                        if closed:
+                            break
+                        time.sleep(self.audio_block_seconds / 2)
+                        continue
+                    started = now()
+                    if aligner is None:
+                        aligner = AudioAligner(fs, self._timeline_origin())
+                    # Padded/trimmed to start at the first frame; the block in flight at STOP is cut there
+                    data = aligner.align(data, arrived, self.stop_time)
+                    if not len(data):
+                        continue # All before the first frame or after STOP; wave can't write an empty block
+                    wav.write(data)
+                    if watch:
+                        watch.check(wav.converter.silent_frames)
+                    metrics.add_time("audio_write", now() - started)
+                    metrics.count("audio_frames", len(data))
+
+                if aligner:
+                    self.av_sync = aligner.report()
+                    logging.info(f"A/V sync: {self.av_sync}")
+                levels = wav.converter
+                if wav.frames:
+                    # Check for silence (debug)
+                    logging.info(f"Audio recorded. Max amplitude: {levels.peak:.4f}, Mean: {levels.mean:.4f}, "
+                                 f"RMS: {dbfs(levels.rms):.1f} dBFS")
+                    
+                    if levels.peak == 0:
+                        logging.warning("Recorded audio is completely silent (0.0). Check microphone volume.")
+                    logging.info(f"Audio recording finished. Frames: {wav.frames}, "
+                                 f"discontinuities: {metrics.get('audio_discontinuities')}")
+                else:
+                    logging.warning("No audio data recorded.")
+                    # Pad to a valid, non-empty silent file
+                    wav.write_silence(100)
+        except Exception as e:
+            logging.error(f"Audio writer failed: {e}")
+            import traceback
+            logging.error(traceback.format_exc())
+
+    def _record_mixed(self, devices):
+        """
+        Captures several devices concurrently (one thread each) and writes their
+        aligned, drift-compensated blocks as one mix or as one track per device.
+        """
+        fs = self.samplerate
+        channels = self.channels
+        tracks = self._audio_track_count()
+        # Small device reads keep the mixer latency low; mixer blocks are as small (and the meters as lively)
+        device_block = int(fs * self.audio_block_seconds)
+        block_size = device_block
+        metrics = self.metrics
+
+        streams = [DeviceStream(d, fs, channels, device_block) for d in devices]
+        for stream in streams:
+            stream.start()
+        logging.info(f"Audio recording started on {[s.name for s in streams]}. Rate={fs}, "
+                     f"Channels={channels}, {'separate tracks' if tracks > 1 else 'mixed'}")
+        # Blocks are produced a little behind real time so every device has delivered its part
+        # Every device is placed on the timeline of the first video frame
+        mixer = AudioMixer(streams, fs, channels, self._timeline_origin(), latency=device_block / fs + 0.3)
+        watch = self._silence_watch(devices)
+        sinks = []
+
+        def write_block(frames):
+            started = now()
+            blocks = mixer.read_tracks(frames) if tracks > 1 else [mixer.read_mix(frames)]
+            for track in range(tracks):
+                if track == len(sinks):
+                    # Opened in order: ffmpeg connects each audio input after the previous one got data
+                    sinks.append(self._open_audio_sink(fs, channels, track))
+                    self.audio_levels = [sink.converter for sink in sinks]
+                if track < len(blocks):
+                    sinks[track].write(blocks[track])
+                else:
+                    sinks[track].write_silence(frames) # Fewer devices than tracks
+            if watch:
+                watch.check(streams[0].silent_frames)
+            metrics.add_time("audio_write", now() - started)
+            metrics.count("audio_frames", frames)
+
+        try:
+            # ffmpeg reads no video until every audio input has delivered its first PCM packet
+            # (up to 100 ms of samples), so the sinks are opened with that much of the timeline
+            # as soon as the devices delivered it (plus a device block for arrival jitter), not a
+            # mixer latency later
+            first = max(device_block, fs // 10)
+            if self.is_recording and mixer.wait_for_time(mixer.t0 + (first + device_block) / fs, mixer.latency):
+                write_block(first)
+            while mixer.wait_for_block(block_size, lambda: self.is_recording):
+                write_block(block_size)
+            # Tail up to the moment STOP was pressed
+            stop_time = self.stop_time or now()
+            remaining = int((stop_time - mixer.t0) * fs) - mixer.produced
+            if remaining > 0:
+                mixer.wait_for_time(stop_time, min(mixer.latency, 1.0))
+                write_block(remaining)
+        finally:
+            for stream in streams:
+                stream.stop(wait=False)
+            for stream in streams:
+                stream.stop()
+            self.audio_stats = mixer.stats()
+            offsets = [d["offset_ms"] for d in self.audio_stats.values() if d["offset_ms"] is not None]
+            self.av_sync = {"offset_ms": offsets[0] if offsets else None, "devices": len(streams)}
+            for track, sink in enumerate(sinks):
+                levels = sink.converter
+                logging.info(f"Audio track {track}: frames {sink.frames}, max amplitude {levels.peak:.4f}, "
+                             f"mean {levels.mean:.4f}")
+                sink.close()
+        underruns = sum(s["underruns"] for s in self.audio_stats.values())
+        metrics.count("audio_underruns", underruns)
+        gaps = sum(s["discontinuities"] for s in self.audio_stats.values())
+        if gaps:
+            metrics.count("audio_discontinuities", gaps)
+            metrics.count("audio_overruns", gaps)
+        logging.info(f"Multi-device audio finished: {self.audio_stats}")
+
+    def _merge_files(self, s, out, output):
+        """
+        Muxes one output's silent video with the session's WAV track(s) into output. Returns True
+        if it was saved. The WAVs are shared by all outputs and removed with the job's temp files.
+        """
+        temp_video = out.temp_video
+        audio_path = s.audio_paths[0]
+        # Extra tracks from separate-track multi-device recordings
+        extra_tracks = [p for p in s.audio_paths[1:] if os.path.exists(p)]
         
         try:
             if not os.path.exists(temp_video):
                 logging.error("No temp video found to merge.")
-                return
+                return False
 
             if not os.path.exists(audio_path) or os.path.getsize(audio_path) < 1000:
                 logging.warning(f"Audio file invalid or too small. Saving video only.")
                 # Just rename/copy video
                 try:
-                    if os.path.exists(self.output_filename):
-                        os.remove(self.output_filename)
-                    os.rename(temp_video, self.output_filename)
+                    place_file(temp_video, output)
                 except Exception as e:
                     logging.error(f"Failed to save video only: {e}")
-                return
+                return os.path.exists(output)
 
             logging.info(f"Merging video {temp_video} and audio {audio_path}...")
             
@@ -229,10 +1381,18 @@ class ScreenRecorder:
                 "ffmpeg", "-y",
                 "-i", temp_video,
                 "-i", audio_path,
+            ]
+            if extra_tracks:
+                for path in extra_tracks:
+                    cmd += ["-i", path]
+                cmd += ["-map", "0:v"]
+                for i in range(len(extra_tracks) + 1):
+                    cmd += ["-map", f"{i + 1}:a"]
+            cmd += [
                 "-c:v", "copy",
                 "-c:a", "aac",
                 "-shortest",
-                self.output_filename
+                output
             ]
             
             logging.info(f"Running command: {' '.join(cmd)}")
@@ -242,16 +1402,15 @@ class ScreenRecorder:
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
-                logging.info(f"Merge successful! Saved to {self.output_filename}")
+                logging.info(f"Merge successful! Saved to {output}")
             else:
                 logging.error(f"FFmpeg merge failed with code {result.returncode}")
                 logging.error(f"FFmpeg stderr: {result.stderr}")
                 # Fallback: keep silent video
                 logging.info("Saving silent video as fallback.")
-                if os.path.exists(self.output_filename):
-                    os.remove(self.output_filename)
-                import shutil
-                shutil.copy(temp_video, self.output_filename)
+                if os.path.exists(output):
+                    os.remove(output)
+                shutil.copy(temp_video, output)
 
         except Exception as e:
             logging.error(f"Error merging files: {e}")
@@ -262,15 +1421,28 @@ class ScreenRecorder:
         if os.path.exists(temp_video):
             try: os.remove(temp_video) 
             except: pass
-        if os.path.exists(audio_path):
-            try: os.remove(audio_path)
-            except: pass
+        return os.path.exists(output)
                 
     def cleanup(self):
         """Destructor-like cleanup"""
         self.is_recording = False
-        if self.video_thread and self.video_thread.is_alive():
-            self.video_thread.join(timeout=1)
+        if self.finalizer.pending():
+            # Don't lose recordings that are still being muxed
+            logging.info(f"Waiting for {len(self.finalizer.pending())} recording(s) being finalized...")
+            self.finalizer.wait(timeout=120)
+        for out in self.outputs:
+            if out.frame_ring:
+                out.frame_ring.close()
+            if out.encoder_process and out.encoder_process.is_alive():
+                out.encoder_process.terminate()
+        if self.video_done:
+            self.video_done.wait(timeout=1)
+        if self._capture:
+            self._capture.close()
+        self.devices.stop()
+        for out in self.outputs:
+            if out.encoder_thread and out.encoder_thread.is_alive():
+                out.encoder_thread.join(timeout=1)
         if self.audio_thread and self.audio_thread.is_alive():
             self.audio_thread.join(timeout=1)
 
@@ -0,0 +1,237 @@
+"""
+Instant replay: keeps the last N seconds of screen and loopback audio in a
+bounded in-memory buffer (JPEG frames + int16 PCM) and dumps them to MP4 on
+request while capture keeps running.
+"""
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import wave
+from collections import deque
+
+import numpy as np
+
+from audio_writer import PcmConverter
+from encoders import DETACHED
+from frame_ops import BgrConverter, FrameScaler
+
+
+class ReplayBuffer:
+    """
+    Time- and memory-capped ring of compressed frames and PCM blocks.
+    Frames are in constant frame rate order (they come from the pacer), so frame
+    i of the buffer shows time first_frame_time + i / fps.
+    """
+
+    def __init__(self, fps, samplerate, channels, max_seconds=30, max_bytes=256 * 1024 * 1024):
+        self.fps = fps
+        self.samplerate = samplerate
+        self.channels = channels
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._frames = deque() # JPEG bytes; repeated frames share one object
+        self._first_frame_time = None # Time of self._frames[0]
+        self._audio = deque() # (start time, int16 array)
+        self.bytes_used = 0
+        self.evicted_frames = 0
+
+    def add_frame(self, data, frame_time):
+        with self._lock:
+            if not self._frames:
+                self._first_frame_time = frame_time
+            elif data is self._frames[-1]:
+                self._frames.append(data) # Repeat: no extra memory
+                self._trim()
+                return
+            self._frames.append(data)
+            self.bytes_used += len(data)
+            self._trim()
+
+    def add_audio(self, start_time, pcm):
+        with self._lock:
+            self._audio.append((start_time, pcm))
+            self.bytes_used += pcm.nbytes
+            self._trim()
+
+    def _trim(self):
+        max_frames = int(self.max_seconds * self.fps)
+        while self._frames and (len(self._frames) > max_frames or self.bytes_used > self.max_bytes):
+            data = self._frames.popleft()
+            self._first_frame_time += 1.0 / self.fps
+            self.evicted_frames += 1
+            if not self._frames or self._frames[0] is not data:
+                self.bytes_used -= len(data) # Last reference to this image
+        # Audio older than the oldest kept frame is never dumped
+        while self._audio and self._frames:
+            start, pcm = self._audio[0]
+            if start + len(pcm) / self.samplerate >= self._first_frame_time:
+                break
+            self._audio.popleft()
+            self.bytes_used -= pcm.nbytes
+
+    def snapshot(self, seconds=None):
+        """
+        Returns (frames, first_frame_time, audio_blocks) for the last `seconds` (all if None).
+        Only references are copied, so this is cheap and capture continues meanwhile.
+        """
+        with self._lock:
+            frames = list(self._frames)
+            first = self._first_frame_time
+            audio = list(self._audio)
+        if seconds is not None and len(frames) > seconds * self.fps:
+            skip = len(frames) - int(seconds * self.fps)
+            frames = frames[skip:]
+            first += skip / self.fps
+        return frames, first, audio
+
+    def audio_sink(self, origin):
+        return ReplayAudioSink(self, origin)
+
+    def save(self, path, seconds=None):
+        """Writes the last `seconds` to an MP4 with ffmpeg. Blocking; returns True on success."""
+        frames, first, audio = self.snapshot(seconds)
+        if not frames:
+            logging.error("Replay buffer is empty.")
+            return False
+        end = first + len(frames) / self.fps
+
+        fd, wav_path = tempfile.mkstemp(suffix=".wav", prefix="replay_")
+        os.close(fd)
+        try:
+            self._write_audio(wav_path, audio, first, end)
+            cmd = [
+                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                "-f", "image2pipe", "-c:v", "mjpeg", "-framerate", str(self.fps), "-i", "pipe:0",
+                "-i", wav_path,
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+                "-vf", "crop=trunc(iw/2)*2:trunc(ih/2)*2", "-pix_fmt", "yuv420p",
+                "-c:a", "aac", "-shortest", "-movflags", "+faststart",
+                path,
+            ]
+            logging.info(f"Saving replay ({len(frames)} frames): {' '.join(cmd)}")
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, **DETACHED)
+            # stderr is small with -loglevel error; read it after stdin is done
+            for data in frames:
+                proc.stdin.write(data)
+            proc.stdin.close()
+            stderr = proc.stderr.read().decode(errors="replace")
+            if proc.wait() != 0:
+                logging.error(f"Replay save failed: {stderr}")
+                return False
+            logging.info(f"Replay saved to {path}")
+            return True
+        except Exception as e:
+            logging.error(f"Replay save failed: {e}")
+            return False
+        finally:
+            try:
+                os.remove(wav_path)
+            except OSError:
+                pass
+
+    def _write_audio(self, wav_path, blocks, start, end):
+        """Writes the PCM covering [start, end) to a WAV, padding gaps with silence."""
+        total = int(round((end - start) * self.samplerate))
+        out = np.zeros((total, self.channels), dtype=np.int16)
+        for block_start, pcm in blocks:
+            offset = int(round((block_start - start) * self.samplerate))
+            src_from = max(0, -offset)
+            dst_from = max(0, offset)
+            count = min(len(pcm) - src_from, total - dst_from)
+            if count > 0:
+                out[dst_from:dst_from + count] = pcm[src_from:src_from + count]
+        with wave.open(wav_path, "wb") as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.samplerate)
+            wav.writeframes(out)
+
+
+class ReplayAudioSink:
+    """
+    Audio sink (same surface as WavStreamWriter) that feeds a ReplayBuffer.
+    The audio it gets is already aligned to the recording's timeline, so a block is
+    placed at origin() + the frames written before it, not at when it arrived
+    (the mixer and the audio writer thread deliver blocks behind real time).
+    origin: returns the timeline's t0 (the first video frame), None before it is known.
+    """
+
+    def __init__(self, buffer, origin):
+        self._buffer = buffer
+        self._origin = origin
+        self.channels = buffer.channels
+        self.converter = PcmConverter(buffer.channels)
+
+    def write(self, block):
+        offset = self.converter.frames / self._buffer.samplerate
+        pcm = self.converter.convert(block).copy() # Converter reuses its buffer
+        t0 = self._origin()
+        if t0 is not None: # Else no video frame yet, so nothing to replay it with
+            self._buffer.add_audio(t0 + offset, pcm)
+
+    def write_silence(self, frames):
+        self.write(np.zeros((frames, self.channels), dtype=np.float32))
+
+    @property
+    def frames(self):
+        return self.converter.frames
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayEncoder:
+    """
+    Encoder-compatible sink for the encoder thread: JPEG-compresses frames into
+    a ReplayBuffer instead of writing a file. output_size (w, h) downscales
+    frames first, which also fits more seconds into the memory cap.
+    """
+    has_audio = True
+    segment_list = None
+
+    def __init__(self, buffer, pacer, quality=80, output_size=None):
+        import cv2
+        self._cv2 = cv2
+        self._buffer = buffer
+        self._pacer = pacer
+        self._params = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+        self._scaler = FrameScaler(output_size) if output_size else None
+        self._converter = BgrConverter()
+        self._last = None
+        self.frames = 0
+        self.repeated = 0
+
+    def _frame_time(self):
+        return self._pacer.t0 + self.frames / self._pacer.fps
+
+    def write(self, frame):
+        if self._scaler:
+            frame = self._scaler.scale(frame)
+        ok, data = self._cv2.imencode(".jpg", self._converter.convert(frame), self._params)
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        self._last = data.tobytes()
+        self._buffer.add_frame(self._last, self._frame_time())
+        self.frames += 1
+
+    def repeat(self):
+        self._buffer.add_frame(self._last, self._frame_time())
+        self.frames += 1
+        self.repeated += 1
+
+    def open_audio(self, track=0):
+        # Frames and audio share the pacer's timeline origin
+        return self._buffer.audio_sink(lambda: self._pacer.t0)
+
+    def close(self):
+        return True
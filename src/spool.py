@@ -0,0 +1,137 @@
+"""
+Spool mode ("capture now, encode later"): the capture loop only copies each
+frame into a preallocated memory-mapped file, and the MP4 is encoded from it
+after stop. Meant for short high-fps bursts that a live encoder can't keep up with.
+
+File layout: a page-aligned header of float64 capture timestamps (one per slot),
+then the raw frames. Both are filled front to back, so the OS only allocates
+what was written and no zero-fill runs ahead of the capture.
+"""
+import logging
+import mmap
+import os
+
+import numpy as np
+
+PAGE = 4096
+
+
+class FrameSpool:
+    """
+    FrameRing-compatible producer side backed by a memory-mapped spool file.
+    Nothing consumes it during the recording; after stop, plan() puts the spooled
+    frames on the constant frame rate timeline and encode() writes a range of it.
+    When the spool is full further frames are dropped (and counted).
+    """
+
+    def __init__(self, path, width, height, max_bytes, channels=4):
+        self.path = path
+        self.shape = (height, width, channels)
+        frame_bytes = width * height * channels
+        self.capacity = max(1, int(max_bytes) // (frame_bytes + 8))
+        header = -(-self.capacity * 8 // PAGE) * PAGE
+        size = header + self.capacity * frame_bytes
+        self._file = open(path, "w+b")
+        # Sized up front (sparse where supported); blocks are allocated as frames land
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self.timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=self._map)
+        self.frames = np.ndarray((self.capacity,) + self.shape, dtype=np.uint8, buffer=self._map, offset=header)
+        self._closed = False
+        self.stop_time = None # Set by the recorder at stop; the video is padded up to it
+
+        # Counters
+        self.frames_in = 0
+        self.frames_out = 0
+        self.dropped_frames = 0
+
+    @property
+    def depth(self):
+        return self.capacity
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def qsize(self):
+        """Frames spooled so far (the live readout shows how full the spool is)."""
+        return self.frames_in
+
+    def put(self, frame, timestamp):
+        """Copies frame into the next slot. Returns False if the spool is closed."""
+        if self._closed:
+            return False
+        index = self.frames_in
+        if index >= self.capacity:
+            if not self.dropped_frames:
+                logging.warning(f"Spool {self.path} is full ({self.capacity} frames); dropping frames until stop.")
+            self.dropped_frames += 1
+            return True
+        self.frames[index] = frame
+        self.timestamps[index] = timestamp
+        self.frames_in = index + 1
+        return True
+
+    def close(self):
+        self._closed = True
+
+    def plan(self, pacer, stop_time=None):
+        """
+        Runs the spooled timestamps through pacer (a fresh FramePacer) and returns the
+        spool index of every output frame, padded with the last frame up to stop_time.
+        frames_out: the spooled frames that made it onto the timeline.
+        """
+        order = []
+        for index, stamp in enumerate(self.timestamps[:self.frames_in].tolist()):
+            repeat, emit = pacer.place(stamp)
+            if repeat:
+                order += [order[-1]] * repeat
+            if emit:
+                order += [index] * emit
+                self.frames_out += 1
+        if order and stop_time is not None:
+            order += [order[-1]] * pacer.finish(stop_time)
+        return order
+
+    def encode(self, encoder, order, start, end, metrics=None, progress=None):
+        """
+        Writes output frames order[start:end] into encoder; a frame equal to the
+        previous one is repeated rather than written again. progress(n) is called
+        every 30 frames and at the end with the frames written so far.
+        """
+        previous = None
+        for n in range(start, end):
+            index = order[n]
+            if index == previous:
+                encoder.repeat()
+            elif metrics:
+                with metrics.stage("write"):
+                    encoder.write(self.frames[index])
+            else:
+                encoder.write(self.frames[index])
+            previous = index
+            if progress and (n - start + 1) % 30 == 0:
+                progress(n - start + 1)
+        if progress:
+            progress(end - start)
+
+    def release(self):
+        """Unmaps and deletes the spool file. Encoders holding a frame view must be gone by now."""
+        self.timestamps = self.frames = None
+        try:
+            self._map.close()
+        except BufferError:
+            logging.warning(f"Spool {self.path} is still in use; it is removed with the job's temp files.")
+            return
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logging.warning(f"Could not remove {self.path}: {e}")
+
+
+def split_ranges(total, jobs, min_size=1):
+    """Splits [0, total) into at most jobs contiguous (start, end) ranges of at least min_size (except a lone one)."""
+    jobs = max(1, min(int(jobs), total // max(int(min_size), 1)))
+    bounds = [round(total * i / jobs) for i in range(jobs + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(jobs)]
@@ -0,0 +1,142 @@
+"""
+Synthetic capture sources with the same surface as mss and soundcard,
+so ScreenRecorder can run without a desktop or a loopback device
+(benchmarks, CI, headless Linux).
+"""
+import time
+
+import numpy as np
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+
+class RawShot:
+    """Mimics mss.screenshot.ScreenShot: raw BGRA bytearray plus size and array interface."""
+
+    def __init__(self, raw, width, height):
+        self.raw = raw
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+
+    @property
+    def __array_interface__(self):
+        return {"version": 3, "shape": (self.height, self.width, 4), "typestr": "|u1", "data": self.raw}
+
+
+class SyntheticScreen:
+    """
+    Mimics an mss.mss() instance for a virtual monitor.
+
+    pattern: "moving" (a bar sweeping over noise, every frame differs),
+             "static" (identical frames, e.g. slides), or "noise" (hard to encode).
+    Frames are pregenerated; each grab copies one into a fresh bytearray, as mss does.
+    """
+
+    def __init__(self, width=1920, height=1080, pattern="moving", variants=8):
+        self.width = width
+        self.height = height
+        self.pattern = pattern
+        self.monitors = [
+            {"left": 0, "top": 0, "width": width, "height": height}, # All monitors
+            {"left": 0, "top": 0, "width": width, "height": height}, # Primary
+        ]
+        self.grabs = 0
+
+        rng = np.random.default_rng(0)
+        if pattern == "noise":
+            frames = [rng.integers(0, 256, (height, width, 4), dtype=np.uint8) for _ in range(variants)]
+        else:
+            base = rng.integers(0, 64, (height, width, 4), dtype=np.uint8)
+            frames = []
+            count = 1 if pattern == "static" else variants
+            for i in range(count):
+                frame = base.copy()
+                x = i * width // count
+                frame[:, x:x + max(1, width // 16), :3] = 255
+                frames.append(frame)
+        self._frames = [f.tobytes() for f in frames]
+
+    def grab(self, monitor):
+        w, h = int(monitor["width"]), int(monitor["height"])
+        self.grabs += 1
+        data = self._frames[self.grabs % len(self._frames)]
+        if (w, h) == (self.width, self.height):
+            return RawShot(bytearray(data), w, h)
+        # Region smaller than the virtual monitor: crop
+        left, top = int(monitor.get("left", 0)), int(monitor.get("top", 0))
+        full = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return RawShot(bytearray(full[top:top + h, left:left + w].tobytes()), w, h)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RealtimeRecorder:
+    """
+    soundcard-like recorder over a source with generate(position, numframes, samplerate);
+    record() blocks for each block's real-time duration, as a device would.
+    """
+
+    def __init__(self, source, samplerate):
+        self._source = source
+        self._samplerate = samplerate
+        self._position = 0
+        self._next_time = None
+
+    def record(self, numframes):
+        """Returns float32 (numframes, channels), blocking for the block's real-time duration."""
+        if self._next_time is None:
+            self._next_time = time.perf_counter()
+        self._next_time += numframes / self._samplerate
+        delay = self._next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        data = self._source.generate(self._position, numframes, self._samplerate)
+        self._position += numframes
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class SyntheticMicrophone:
+    """Mimics a soundcard microphone producing a sine, noise or silence in real time."""
+
+    def __init__(self, signal="sine", frequency=440.0, amplitude=0.3, channels=2, name="Synthetic", loopback=True):
+        self.name = name
+        self.id = name
+        self.isloopback = loopback
+        self.channels = channels
+        self.signal = signal
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.rng = np.random.default_rng(1)
+
+    def generate(self, position, numframes, samplerate):
+        if self.signal == "noise":
+            mono = self.rng.uniform(-1.0, 1.0, numframes) * self.amplitude
+        elif self.signal == "silence":
+            mono = np.zeros(numframes)
+        else:
+            t = (np.arange(numframes) + position) / samplerate
+            mono = np.sin(2 * np.pi * self.frequency * t) * self.amplitude
+        return np.repeat(mono.astype(np.float32)[:, None], self.channels, axis=1)
+
+    def recorder(self, samplerate, channels=None, blocksize=None):
+        return RealtimeRecorder(self, samplerate)
@@ -38,20 +38,91 @@ class RegionSelector(tk.Toplevel):
     def hide(self):
         self.withdraw()
 
+class PreviewWindow(tk.Toplevel):
+    """
+    Live preview of what is being recorded: polls the recorder's preview tap (a small
+    copy of an already grabbed frame, no extra capture) and shows it as a PPM PhotoImage.
+    Keep it outside the recorded region, or it records itself.
+    """
+
+    def __init__(self, parent, recorder, on_close=None):
+        super().__init__(parent)
+        self.recorder = recorder
+        self.on_close = on_close
+        self.title("Preview")
+        self.attributes("-topmost", True)
+        self.resizable(False, False)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.photo = tk.PhotoImage(width=320, height=180)
+        tk.Label(self, image=self.photo, bg="black").pack()
+        self.info_var = tk.StringVar(value="Not recording")
+        ttk.Label(self, textvariable=self.info_var, font=("Consolas", 8)).pack()
+        self.tap = None
+        self.poll_job = None
+        self.shown = None # Frame array on screen, to skip redrawing an unchanged one
+        self.withdraw()
+
+    def show(self):
+        self.tap = self.recorder.start_preview()
+        self.deiconify()
+        if self.poll_job is None:
+            self.poll()
+
+    def hide(self):
+        self.recorder.stop_preview()
+        if self.poll_job:
+            self.after_cancel(self.poll_job)
+            self.poll_job = None
+        self.withdraw()
+
+    def close(self):
+        self.hide()
+        if self.on_close:
+            self.on_close()
+
+    def poll(self):
+        self.poll_job = self.after(int(self.tap.interval * 1000), self.poll)
+        if not self.recorder.is_recording:
+            self.info_var.set("Not recording")
+            return
+        frame = self.tap.frame
+        if frame is None or frame is self.shown:
+            return
+        self.shown = frame
+        h, w = frame.shape[:2]
+        try:
+            # Binary PPM: Tk decodes it natively, no PIL needed
+            self.photo.configure(width=w, height=h, format="PPM", data=b"P6 %d %d 255\n" % (w, h) + frame.tobytes())
+        except tk.TclError as e:
+            logging.error(f"Preview update failed: {e}")
+            return
+        m = self.recorder.monitor
+        self.info_var.set(f"{m['width']}x{m['height']} at {m['left']},{m['top']}")
+
+
 class MainUI:
     def __init__(self, root, recorder=None, app_cleanup_callback=None):
         self.root = root
         self.recorder = recorder
         self.cleanup = app_cleanup_callback
         self.root.title("Antigravity Recorder")
-        self.root.geometry("300x250")
+        self.root.geometry("300x430")
         self.root.attributes("-topmost", True)
         
         # Variables
         self.mode = tk.StringVar(value="region")
         self.coords_var = tk.StringVar(value="Select Region")
         self.status_var = tk.StringVar(value="Initializing..." if recorder is None else "Ready")
+        self.metrics_var = tk.StringVar(value="")
+        self.metrics_job = None
+        self.level_var = tk.StringVar(value="") # Audio level readout next to the meter
+        self.audio_warning_var = tk.StringVar(value="")
+        self.jobs_var = tk.StringVar(value="") # Background finalization progress
+        self.save_paths = {} # FinalizeJob -> path chosen in the save dialog ("" = discard)
         self.region_coords = None
+        self.preview_var = tk.BooleanVar(value=False)
+        self.preview_window = None
 
         # Style
         style = ttk.Style()
@@ -89,12 +160,49 @@ class MainUI:
         
         self.btn_stop = ttk.Button(btn_frame, text="STOP", command=self.stop_recording, state=tk.DISABLED)
         self.btn_stop.pack(side=tk.LEFT, padx=5)
+
+        # Instant replay: keep the last N seconds, save on demand
+        replay_frame = ttk.Frame(frame)
+        replay_frame.pack()
+
+        self.btn_replay = ttk.Button(replay_frame, text="Replay: OFF", command=self.toggle_replay)
+        self.btn_replay.pack(side=tk.LEFT, padx=5)
+
+        self.btn_save_replay = ttk.Button(replay_frame, text="SAVE REPLAY", command=self.save_replay, state=tk.DISABLED)
+        self.btn_save_replay.pack(side=tk.LEFT, padx=5)
+
+        # Live preview of the recorded region (a tap of the captured frames)
+        self.chk_preview = ttk.Checkbutton(frame, text="Live preview", variable=self.preview_var,
+                                           command=self.toggle_preview)
+        self.chk_preview.pack(pady=2)
+
+        if self.recorder is None:
+            self.btn_replay.config(state=tk.DISABLED)
+            self.chk_preview.config(state=tk.DISABLED)
         
         btn_exit = ttk.Button(frame, text="EXIT", command=self.on_exit)
         btn_exit.pack(pady=5)
         
         self.lbl_status = ttk.Label(frame, textvariable=self.status_var)
         self.lbl_status.pack(pady=5)
+
+        # Live recording metrics
+        self.lbl_metrics = ttk.Label(frame, textvariable=self.metrics_var, font=("Consolas", 8))
+        self.lbl_metrics.pack()
+
+        # Audio level meter: peak of the last block, -60..0 dBFS
+        level_frame = ttk.Frame(frame)
+        level_frame.pack()
+        self.level_bar = ttk.Progressbar(level_frame, orient=tk.HORIZONTAL, length=180, maximum=60)
+        self.level_bar.pack(side=tk.LEFT, padx=5)
+        ttk.Label(level_frame, textvariable=self.level_var, font=("Consolas", 8), width=8).pack(side=tk.LEFT)
+        self.lbl_audio_warning = ttk.Label(frame, textvariable=self.audio_warning_var, foreground="red",
+                                           font=("Helvetica", 8), wraplength=280)
+        self.lbl_audio_warning.pack()
+
+        # Recordings still being finalized after STOP
+        self.lbl_jobs = ttk.Label(frame, textvariable=self.jobs_var, font=("Consolas", 8))
+        self.lbl_jobs.pack()
         
         # Region Picker
         self.region_window = RegionSelector(root, self.update_coords_display)
@@ -104,6 +212,16 @@ class MainUI:
         self.recorder = recorder
         self.status_var.set("Ready")
         self.btn_start.config(state=tk.NORMAL, text="START Recording")
+        self.btn_replay.config(state=tk.NORMAL)
+        self.chk_preview.config(state=tk.NORMAL)
+
+    def toggle_preview(self):
+        if self.preview_window is None:
+            self.preview_window = PreviewWindow(self.root, self.recorder, on_close=lambda: self.preview_var.set(False))
+        if self.preview_var.get():
+            self.preview_window.show()
+        else:
+            self.preview_window.hide()
 
     def update_coords_display(self, x, y, w, h):
         self.region_coords = (x, y, w, h)
@@ -131,10 +249,8 @@ class MainUI:
         self.region_window.hide()
         
         # Output file
-        # We start generic, save dialog later
-        # Output file
-        # We start generic, save dialog later
-        filename = "temp_recording_merged.mp4" # Intermediate
+        # We start generic, save dialog later; the recorder picks a per-recording temp file
+        filename = None
         
 
         try:
@@ -152,36 +268,150 @@ class MainUI:
             self.status_var.set("Recording...")
             self.btn_start.config(state=tk.DISABLED)
             self.btn_stop.config(state=tk.NORMAL)
+            self.btn_replay.config(state=tk.DISABLED)
+            self.schedule_metrics_update()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start: {e}")
             self.root.deiconify()
 
+    def schedule_metrics_update(self):
+        self.metrics_job = self.root.after(500, self.update_metrics_display)
+
+    def update_metrics_display(self):
+        """Refreshes the live readout every 500 ms while recording."""
+        self.metrics_job = None
+        if not self.recorder or not self.recorder.is_recording:
+            return
+        try:
+            m = self.recorder.live_metrics()
+            audio = f"audio overruns {m['audio_overruns']}" if m["audio_overruns"] else "audio ok"
+            self.metrics_var.set(
+                f"{m['fps']:.1f} fps (cap {m['capture_fps']:.1f}) | q {m['queue']}/{m['queue_depth']} | drop {m['dropped']}\n"
+                f"grab {m['grab_ms']:.0f} conv {m['convert_ms']:.0f} write {m['write_ms']:.0f} ms | {audio}"
+            )
+            self.level_bar["value"] = max(0.0, 60 + m["audio_peak_db"])
+            self.level_var.set(f"{m['audio_peak_db']:.0f} dB" if m["audio_peak_db"] > -60 else "silent")
+            self.audio_warning_var.set(m["audio_warning"] or "")
+        except Exception as e:
+            logging.error(f"Metrics update failed: {e}")
+        self.schedule_metrics_update()
+
     def stop_recording(self):
-        self.status_var.set("Stopping...")
-        self.root.update()
+        if self.metrics_job:
+            self.root.after_cancel(self.metrics_job)
+            self.metrics_job = None
         
         try:
-            self.recorder.stop_recording()
-            
-            # Save Dialog
-            save_path = filedialog.asksaveasfilename(defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4")])
-            if save_path:
-                # Move internal file to user location
-                import shutil
-                # The recorder already merged to "temp_recording_merged.mp4"
-                if os.path.exists("temp_recording_merged.mp4"):
-                    shutil.move("temp_recording_merged.mp4", save_path)
-                    messagebox.showinfo("Success", f"Saved to {save_path}")
-            
+            # Returns as soon as capture has stopped; encoding/muxing continues in the background
+            job = self.recorder.stop_recording_async(
+                on_progress=lambda job: self.root.after(0, self.update_jobs_display),
+                on_done=lambda job: self.root.after(0, lambda: self.on_job_done(job)))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save: {e}")
+            messagebox.showerror("Error", f"Failed to stop: {e}")
+            job = None
         finally:
+            # Ready for the next recording right away
             self.status_var.set("Ready")
+            self.metrics_var.set("")
+            self.level_var.set("")
+            self.level_bar["value"] = 0
+            self.audio_warning_var.set("")
             self.btn_start.config(state=tk.NORMAL)
             self.btn_stop.config(state=tk.DISABLED)
+            self.btn_replay.config(state=tk.NORMAL)
             self.root.deiconify()
             if self.mode.get() == 'region':
                 self.region_window.show()
+        if job is None:
+            return
+        self.update_jobs_display()
+
+        # Save Dialog (the job keeps finalizing meanwhile). If it closes before the file
+        # is written, the job writes it at the chosen path directly instead of moving it later.
+        save_path = filedialog.asksaveasfilename(defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4")])
+        try:
+            if save_path:
+                job.save_as(save_path)
+            else:
+                job.discard() # Save dialog cancelled: drop the recording
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save: {e}")
+            return
+        self.save_paths[job] = save_path
+        if job.done:
+            self.deliver_job(job)
+
+    def on_job_done(self, job):
+        self.update_jobs_display()
+        # Otherwise the save dialog is still open and delivers when it closes
+        if job in self.save_paths:
+            self.deliver_job(job)
+
+    def deliver_job(self, job):
+        """Reports a finalized recording once it is saved where the user chose (extra regions as name_2.mp4, ...)."""
+        save_path = self.save_paths.pop(job, None)
+        if not save_path:
+            return # Already delivered, or discarded
+        try:
+            if not job.ok or not os.path.exists(job.output):
+                messagebox.showerror("Error", "Failed to save recording, see app.log")
+                return
+            # Metrics summary next to the video
+            self.recorder.write_metrics(os.path.splitext(save_path)[0] + ".metrics.json", job.session)
+            messagebox.showinfo("Success", f"Saved to {save_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save: {e}")
+
+    def update_jobs_display(self):
+        """Shows the progress of recordings still being finalized."""
+        if not self.recorder:
+            return
+        lines = [f"Finalizing {job.name}: {job.stage} {job.progress * 100:.0f}%"
+                 for job in self.recorder.finalizer.pending()]
+        self.jobs_var.set("\n".join(lines))
+
+    def toggle_replay(self):
+        if self.recorder.is_replay:
+            self.recorder.stop_replay()
+            self.status_var.set("Ready")
+            self.btn_replay.config(text="Replay: OFF")
+            self.btn_save_replay.config(state=tk.DISABLED)
+            self.btn_start.config(state=tk.NORMAL)
+            if self.mode.get() == 'region':
+                self.region_window.show()
+            return
+
+        if self.mode.get() == "region" and not self.region_coords:
+            messagebox.showerror("Error", "Please select a region first.")
+            return
+        try:
+            self.region_window.hide()
+            self.recorder.start_replay(self.region_coords)
+            self.status_var.set(f"Replay buffer: last {self.recorder.replay_seconds}s")
+            self.btn_replay.config(text="Replay: ON")
+            self.btn_save_replay.config(state=tk.NORMAL)
+            self.btn_start.config(state=tk.DISABLED)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to start replay: {e}")
+
+    def save_replay(self):
+        save_path = filedialog.asksaveasfilename(defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4")])
+        if not save_path:
+            return
+        self.status_var.set("Saving replay...")
+
+        def on_done(ok, path):
+            # Called from the save thread; hand back to Tk
+            def update():
+                if self.recorder.is_replay:
+                    self.status_var.set(f"Replay buffer: last {self.recorder.replay_seconds}s")
+                if ok:
+                    messagebox.showinfo("Success", f"Replay saved to {path}")
+                else:
+                    messagebox.showerror("Error", "Failed to save replay, see app.log")
+            self.root.after(0, update)
+
+        self.recorder.save_replay(save_path, on_done=on_done)
 
     def on_exit(self):
         self.cleanup()